@@ -1,35 +1,86 @@
 import hashlib
+import hmac
 import os
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class KeyCache:
+    def __init__(self, capacity: int = 64, ttl: float = 300.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.secret = os.urandom(16)
+        self.keys: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, salt: bytes, password: str, iterations: int) -> Tuple[bytes, bytes, int]:
+        return salt, hashlib.blake2b(password.encode(), key=self.secret, digest_size=32).digest(), iterations
+
+    def get(self, key: Tuple[bytes, bytes, int]) -> Optional[bytes]:
+        with self.lock:
+            item = self.keys.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self.keys[key]
+                self.misses += 1
+                return None
+            self.keys.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Tuple[bytes, bytes, int], derived: bytes):
+        with self.lock:
+            self.keys[key] = (derived, time.monotonic() + self.ttl)
+            self.keys.move_to_end(key)
+            while len(self.keys) > self.capacity:
+                self.keys.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+
+
+KEY_CACHE = KeyCache()
 
 
 class AccessControl:
-    def __init__(self):
+    ITERATIONS = 100000
+
+    def __init__(self, iterations: int = ITERATIONS, key_cache: Optional[KeyCache] = KEY_CACHE):
+        if iterations < 1:
+            raise ValueError(f"неверное число итераций KDF: {iterations}")
         self.password_hash = None
+        self.iterations = iterations
+        self.key_cache = key_cache
+
+    def derive_key(self, password: str, salt: bytes, iterations: Optional[int] = None) -> bytes:
+        iterations = iterations or self.iterations
+        if self.key_cache is None:
+            return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+        key = self.key_cache.key(salt, password, iterations)
+        derived = self.key_cache.get(key)
+        if derived is None:
+            derived = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+            self.key_cache.put(key, derived)
+        return derived
 
     def set_password(self, password: str) -> bytes:
         random = os.urandom(16)
-        password_hash = hashlib.pbkdf2_hmac(
-            'sha256',
-            password.encode(),
-            random,
-            100000
-        )
+        password_hash = self.derive_key(password, random)
         self.password_hash = random + password_hash
         return self.password_hash
 
-    def verify_password(self, password: str, stored_hash: bytes) -> bool:
+    def verify_password(self, password: str, stored_hash: bytes, iterations: Optional[int] = None) -> bool:
         if not stored_hash or len(stored_hash) != 48:
             return False
         random = stored_hash[:16]
         stored_password_hash = stored_hash[16:]
-        new_hash = hashlib.pbkdf2_hmac(
-            'sha256',
-            password.encode(),
-            random,
-            100000
-        )
-        return new_hash == stored_password_hash
+        new_hash = self.derive_key(password, random, iterations)
+        return hmac.compare_digest(new_hash, stored_password_hash)
 
     def is_protected(self, stored_hash: Optional[bytes]) -> bool:
-        return stored_hash is not None and len(stored_hash) == 48
\ No newline at end of file
+        return stored_hash is not None and len(stored_hash) == 48
@@ -1,28 +1,187 @@
 import os
+import io
+import sys
 import json
-from typing import Optional, List, Dict
-from compressor import ShannonFanoCompressor
+import hashlib
+import mmap
+import queue
+import struct
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, List, Dict, Iterator, Iterable, Callable, Tuple
+from compressor import CodeTableCache, ShannonFanoCompressor
+from canonical import code_lengths
 from decompressor import ShannonFanoDecompressor
 from access_control import AccessControl
+from instrumentation import Instrumentation
 
 
 class FileEntry:
+    __slots__ = ('filename', 'size', 'compressed_size', 'metadata', 'codes', 'padding',
+                 'source', 'blocks', 'offset', 'method')
+
     def __init__(self, filename: str, size: int, compressed_size: int,
-                 metadata: Dict, codes: Dict[int, str], padding: int):
+                 metadata: Dict, codes: Dict[int, str], padding: int,
+                 source: Optional[str] = None, blocks: Optional[List['BlockEntry']] = None,
+                 offset: int = 0, method: int = 0):
         self.filename = filename
         self.size = size
         self.compressed_size = compressed_size
         self.metadata = metadata
         self.codes = codes
         self.padding = padding
+        self.source = source
+        self.blocks = blocks
+        self.offset = offset
+        self.method = method
 
 
-class FileArchiver:
-    SIGNATURE = b'SFv3'
+class BlockEntry:
+    __slots__ = ('offset', 'size', 'compressed_size', 'codes', 'padding', 'method')
+
+    def __init__(self, offset: int, size: int, compressed_size: int,
+                 codes: Dict[int, str], padding: int, method: int = 0):
+        self.offset = offset
+        self.size = size
+        self.compressed_size = compressed_size
+        self.codes = codes
+        self.padding = padding
+        self.method = method
+
+
+class PipelineStats:
+    STAGES = ('scan', 'read', 'encode', 'write')
+    QUEUES = ('paths', 'reads', 'encoded')
+
     def __init__(self):
-        self.compressor = ShannonFanoCompressor()
-        self.decompressor = ShannonFanoDecompressor()
-        self.access_control = AccessControl()
+        self.lock = threading.Lock()
+        self.stage_time = dict.fromkeys(self.STAGES, 0.0)
+        self.max_depth = dict.fromkeys(self.QUEUES, 0)
+        self.depth_total = dict.fromkeys(self.QUEUES, 0)
+        self.samples = dict.fromkeys(self.QUEUES, 0)
+        self.max_read_ahead = 0
+
+    def add_time(self, stage: str, seconds: float):
+        with self.lock:
+            self.stage_time[stage] += seconds
+
+    def sample(self, name: str, depth: int):
+        with self.lock:
+            self.max_depth[name] = max(self.max_depth[name], depth)
+            self.depth_total[name] += depth
+            self.samples[name] += 1
+
+    def summary(self) -> Dict[str, Dict]:
+        return {
+            'stage_time': dict(self.stage_time),
+            'max_depth': dict(self.max_depth),
+            'mean_depth': {name: self.depth_total[name] / self.samples[name] if self.samples[name] else 0.0
+                           for name in self.QUEUES},
+            'max_read_ahead': self.max_read_ahead
+        }
+
+
+class ReadWindow:
+    def __init__(self, files: int, size: int):
+        self.files = files
+        self.size = size
+        self.used = 0
+        self.peak = 0
+        self.reserved: Dict[int, int] = {}
+        self.condition = threading.Condition()
+
+    def _fits(self, size: int) -> bool:
+        return not self.reserved or (len(self.reserved) < self.files and self.used + size <= self.size)
+
+    def acquire(self, sequence: int, size: int, timeout: float) -> bool:
+        with self.condition:
+            if not self.condition.wait_for(lambda: self._fits(size), timeout):
+                return False
+            self.reserved[sequence] = size
+            self.used += size
+            self.peak = max(self.peak, self.used)
+            return True
+
+    def release(self, sequence: int):
+        with self.condition:
+            self.used -= self.reserved.pop(sequence)
+            self.condition.notify_all()
+
+
+class MemberReader(io.RawIOBase):
+    def __init__(self, source, chunks: Iterator[bytes]):
+        super().__init__()
+        self.source = source
+        self.chunks = chunks
+        self.pending = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.pending:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.chunks.close()
+            self.source.close()
+        super().close()
+
+
+class FileArchiver:
+    SIGNATURE = b'SFv6'
+    JSON_SIGNATURE = b'SFv5'
+    LEGACY_SIGNATURE = b'SFv3'
+    BLOCK_SIGNATURE = b'SFv4'
+    FOOTER_MAGIC = b'SFCD'
+    FOOTER_SIZE = 16
+    CHUNK_SIZE = 1 << 20
+    BLOCK_SIZE = 1 << 20
+    IN_FLIGHT_PER_JOB = 2
+    SAMPLE_SIZE = 1 << 12
+    TRAIN_SIZE = 1 << 20
+    DIRECTORY_HEADER = struct.Struct('>IIII')
+    ENTRY_RECORD = struct.Struct('>IQQQddIBBII16s')
+    BLOCK_RECORD = struct.Struct('>QQBBI')
+    ENTRY_BLOCKS = 1
+    ENTRY_STORED = 2
+    ENTRY_ADAPTIVE = 4
+    METHOD_SHANNON_FANO = 0
+    METHOD_STORED = 1
+    METHOD_ADAPTIVE = 2
+    STDIN_NAME = 'stdin'
+    PROBE_SIZE = 1 << 16
+    DIGEST_SIZE = 16
+    READ_THREADS = 4
+    WRITE_THREADS = 4
+    QUEUE_SIZE = 16
+    READ_AHEAD_BYTES = 1 << 28
+    POLL_INTERVAL = 0.05
+    PASSWORD_ATTEMPTS = 3
+    def __init__(self, symbol_bits: int = 8, table_cache: int = 0, quiet: bool = False,
+                 instrumentation: Optional[Instrumentation] = None, kdf_iterations: int = AccessControl.ITERATIONS):
+        self.instrumentation = instrumentation or Instrumentation()
+        self.compressor = ShannonFanoCompressor(
+            canonical=True, symbol_bits=symbol_bits,
+            table_cache=CodeTableCache(table_cache) if table_cache else None,
+            instrumentation=self.instrumentation)
+        self.decompressor = ShannonFanoDecompressor(quiet=quiet, instrumentation=self.instrumentation)
+        self.quiet_decompressor = self.decompressor if quiet else ShannonFanoDecompressor(
+            quiet=True, instrumentation=self.instrumentation)
+        self.access_control = AccessControl(kdf_iterations)
+        self.quiet = quiet
+        self.pipeline_stats: Optional[PipelineStats] = None
 
     def _get_file_metadata(self, filepath: str) -> Dict:
         stat = os.stat(filepath)
@@ -33,47 +192,51 @@ class FileArchiver:
             'mode': stat.st_mode
         }
 
-    def compress_files(self, paths: List[str], password: Optional[str] = None) -> bool:
+    def compress_files(self, paths: List[str], password: Optional[str] = None,
+                       chunk_size: Optional[int] = None, jobs: int = 1,
+                       block_size: Optional[int] = None, shared_table: bool = False,
+                       pipeline: bool = False, adaptive: bool = False) -> bool:
+        executor = None
+        output_name = None
         try:
             file_entries = []
-            all_compressed_data = bytearray()
             password_hash = None
             if password:
                 password_hash = self.access_control.set_password(password)
                 print(f"Архив защищен паролем")
-            for path in paths:
-                if os.path.isfile(path):
-                    self._process_file(path, file_entries, all_compressed_data)
-                elif os.path.isdir(path):
-                    self._process_directory(path, file_entries, all_compressed_data)
+            adaptive = adaptive or '-' in paths
+            if adaptive and (pipeline or shared_table or chunk_size or block_size or jobs > 1
+                             or self.compressor.symbol_bits != 8):
+                raise ValueError("адаптивный режим (--adaptive, stdin) нельзя сочетать с конвейером, общей таблицей, "
+                                 "потоковым или блочным режимом, -j и 16-битными символами")
+            if pipeline and (chunk_size or block_size):
+                raise ValueError("конвейер (--pipeline) нельзя сочетать с потоковым или блочным режимом")
+            if jobs > 1:
+                chunk_size = chunk_size or self.CHUNK_SIZE
+                executor = ProcessPoolExecutor(max_workers=jobs)
+            if pipeline and not shared_table:
+                files = self._iter_files(paths)
+                file_count = 0
+            else:
+                files = self._collect_files(paths)
+                file_count = len(files)
+            self.compressor.shared_codes = self._train_shared_table(files) if shared_table else None
             output_name = "archive.sf"
             if len(paths) == 1 and os.path.isfile(paths[0]):
                 output_name = paths[0] + '.sf'
             with open(output_name, 'wb') as f:
-                f.write(self.SIGNATURE)
-                access_header = {
-                    'password_protected': password is not None,
-                    'password_hash': password_hash.hex() if password_hash else None,
-                    'file_count': len(file_entries)
-                }
-                access_data = json.dumps(access_header).encode('utf-8')
-                f.write(len(access_data).to_bytes(4, 'big'))
-                f.write(access_data)
-                for entry in file_entries:
-                    file_header = {
-                        'filename': entry.filename,
-                        'size': entry.size,
-                        'compressed_size': entry.compressed_size,
-                        'metadata': entry.metadata,
-                        'padding': entry.padding
-                    }
-                    header_data = json.dumps(file_header).encode('utf-8')
-                    f.write(len(header_data).to_bytes(4, 'big'))
-                    f.write(header_data)
-                    codes_data = self.compressor._serialize_codes(entry.codes)
-                    f.write(len(codes_data).to_bytes(4, 'big'))
-                    f.write(codes_data)
-                f.write(all_compressed_data)
+                self._write_access_header(f, password_hash, file_count)
+                if pipeline:
+                    self._write_pipeline(f, files, file_entries, executor)
+                    self._print_pipeline_stats()
+                elif adaptive:
+                    for filepath in files:
+                        file_entries.append(self._write_adaptive(f, filepath))
+                else:
+                    self._write_members(f, files, file_entries, chunk_size, block_size, executor, jobs)
+                with self.instrumentation.timer('directory'):
+                    self._write_directory(f, file_entries)
+            self._count_entries(file_entries, 'bytes_in', 'bytes_out')
             self._print_statistics(file_entries)
             print(f"Создан архив: {output_name}")
             return True
@@ -81,28 +244,559 @@ class FileArchiver:
             print(f"Ошибка при сжатии: {e}")
             import traceback
             traceback.print_exc()
+            if output_name and os.path.exists(output_name):
+                os.remove(output_name)
+            return False
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+    def update(self, archive_path: str, paths: List[str], password: Optional[str] = None,
+               chunk_size: Optional[int] = None, jobs: int = 1, block_size: Optional[int] = None) -> bool:
+        executor = None
+        try:
+            with self._open_mapped(archive_path) as source:
+                if source.read(4) != self.SIGNATURE:
+                    print("Ошибка: обновлять можно только архивы SFv6")
+                    return False
+                source.seek(0)
+                file_entries = self._open_archive(source, password)
+                if file_entries is None:
+                    return False
+            if jobs > 1:
+                chunk_size = chunk_size or self.CHUNK_SIZE
+                executor = ProcessPoolExecutor(max_workers=jobs)
+            positions = {entry.filename: index for index, entry in enumerate(file_entries)}
+            changed = []
+            unchanged = 0
+            refreshed = 0
+            for filepath in self._collect_files(paths):
+                index = positions.get(os.path.basename(filepath))
+                state = self._compare_entry(filepath, file_entries[index]) if index is not None else None
+                if state is None:
+                    changed.append(filepath)
+                else:
+                    unchanged += 1
+                    refreshed += state
+            if not changed and not refreshed:
+                print(f"Без изменений: {unchanged}, архив не перезаписан")
+                return True
+            updated = []
+            with open(archive_path, 'r+b') as f:
+                original_size = f.seek(0, os.SEEK_END)
+                try:
+                    self._write_members(f, changed, updated, chunk_size, block_size, executor, jobs)
+                    added = sum(1 for entry in updated if entry.filename not in positions)
+                    for entry in updated:
+                        if entry.filename in positions:
+                            file_entries[positions[entry.filename]] = entry
+                        else:
+                            positions[entry.filename] = len(file_entries)
+                            file_entries.append(entry)
+                    self._write_directory(f, file_entries)
+                except BaseException:
+                    f.truncate(original_size)
+                    raise
+            print(f"Без изменений: {unchanged}, обновлено: {len(updated) - added}, добавлено: {added}")
+            print(f"Обновлен архив: {archive_path}")
+            return True
+        except Exception as e:
+            print(f"Ошибка при обновлении: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+    def _compare_entry(self, filepath: str, entry: FileEntry) -> Optional[bool]:
+        metadata = self._get_file_metadata(filepath)
+        if metadata['size'] != entry.size:
+            return None
+        if metadata['mtime'] == entry.metadata.get('mtime'):
             return False
+        if entry.metadata.get('digest') != _file_digest(filepath, self.CHUNK_SIZE):
+            return None
+        entry.metadata['mtime'] = metadata['mtime']
+        entry.metadata['atime'] = metadata['atime']
+        return True
 
-    def _process_file(self, filepath: str, file_entries: List, all_compressed_data: bytearray):
+    def _write_members(self, f, files: List[str], file_entries: List[FileEntry], chunk_size: Optional[int],
+                       block_size: Optional[int], executor: Optional[ProcessPoolExecutor], jobs: int):
+        if block_size:
+            self._write_blocks(f, files, block_size, file_entries, executor, jobs)
+        elif executor:
+            compressed = self._ordered_map(executor, _compress_file_job, [
+                (filepath, chunk_size, self._job_settings()) for filepath in files], jobs)
+            for entry, data in compressed:
+                entry.offset = f.tell()
+                with self.instrumentation.timer('write'):
+                    f.write(data)
+                file_entries.append(entry)
+        elif chunk_size:
+            for filepath in files:
+                entry = self._scan_file(filepath, chunk_size)
+                entry.offset = f.tell()
+                self._write_stream(f, entry, chunk_size)
+                file_entries.append(entry)
+        else:
+            for filepath in files:
+                self._process_file(filepath, file_entries, f)
+
+    def _job_settings(self) -> Tuple[int, Optional[Dict[int, str]], int]:
+        cache = self.compressor.table_cache
+        return self.compressor.symbol_bits, self.compressor.shared_codes, cache.capacity if cache else 0
+
+    def _train_shared_table(self, files: List[str]) -> Dict[int, str]:
+        frequencies = Counter()
+        budget = self.TRAIN_SIZE
+        for filepath in files:
+            if budget <= 0:
+                break
+            sample = _read_range(filepath, 0, min(self.SAMPLE_SIZE, budget))
+            frequencies.update(self.compressor.calculate_frequencies(sample))
+            budget -= len(sample)
+        return self.compressor.build_shared_codes(frequencies)
+
+    def _ordered_map(self, executor: Optional[ProcessPoolExecutor], function: Callable,
+                     arguments: Iterable[Tuple], jobs: int) -> Iterator:
+        if executor is None:
+            for args in arguments:
+                yield function(*args)
+            return
+        pending = deque()
+        for args in arguments:
+            pending.append(executor.submit(function, *args))
+            if len(pending) >= jobs * self.IN_FLIGHT_PER_JOB:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def _write_blocks(self, f, files: List[str], block_size: int, file_entries: List[FileEntry],
+                      executor: Optional[ProcessPoolExecutor], jobs: int):
+        metadatas = [self._get_file_metadata(filepath) for filepath in files]
+        tasks = []
+        for filepath, metadata in zip(files, metadatas):
+            size = metadata['size']
+            tasks.extend((filepath, offset, min(block_size, size - offset), self._job_settings())
+                         for offset in range(0, size, block_size))
+        compressed = iter(self._ordered_map(executor, _compress_block_job, tasks, jobs))
+        for filepath, metadata in zip(files, metadatas):
+            metadata['digest'] = _file_digest(filepath, self.CHUNK_SIZE)
+            entry = FileEntry(
+                filename=os.path.basename(filepath),
+                size=0,
+                compressed_size=0,
+                metadata=metadata,
+                codes={},
+                padding=0,
+                source=filepath,
+                blocks=[],
+                offset=f.tell()
+            )
+            for offset in range(0, metadata['size'], block_size):
+                size, codes, padding, data, method = next(compressed)
+                entry.blocks.append(BlockEntry(offset, size, len(data), codes, padding, method))
+                entry.size += size
+                entry.compressed_size += len(data)
+                with self.instrumentation.timer('write'):
+                    f.write(data)
+            file_entries.append(entry)
+
+    def _write_access_header(self, f, password_hash: Optional[bytes], file_count: int,
+                             signature: bytes = SIGNATURE):
+        f.write(signature)
+        access_header = {
+            'password_protected': password_hash is not None,
+            'password_hash': password_hash.hex() if password_hash else None,
+            'file_count': file_count
+        }
+        if password_hash:
+            access_header['kdf_iterations'] = self.access_control.iterations
+        access_data = json.dumps(access_header).encode('utf-8')
+        f.write(len(access_data).to_bytes(4, 'big'))
+        f.write(access_data)
+
+    def _write_directory(self, f, file_entries: List[FileEntry]):
+        directory_offset = f.tell()
+        names: Dict[str, int] = {}
+        tables: Dict[bytes, int] = {}
+        records = bytearray()
+        block_records = bytearray()
+        block_count = 0
+
+        known: Dict[int, int] = {}
+
+        def table_index(codes: Dict[int, str]) -> int:
+            if id(codes) not in known:
+                table = self.compressor._serialize_code_lengths(code_lengths(codes))
+                known[id(codes)] = tables.setdefault(table, len(tables))
+            return known[id(codes)]
+
+        for entry in file_entries:
+            name_index = names.setdefault(entry.filename, len(names))
+            flags = 0
+            if entry.blocks is not None:
+                flags |= self.ENTRY_BLOCKS
+                first_block = block_count
+                for block in entry.blocks:
+                    block_records += self.BLOCK_RECORD.pack(
+                        block.size, block.compressed_size, block.padding, block.method,
+                        table_index(block.codes) if block.method == self.METHOD_SHANNON_FANO else 0)
+                    block_count += 1
+                codes_index = first_block
+            elif entry.method == self.METHOD_STORED:
+                flags |= self.ENTRY_STORED
+                codes_index = 0
+            elif entry.method == self.METHOD_ADAPTIVE:
+                flags |= self.ENTRY_ADAPTIVE
+                codes_index = 0
+            else:
+                codes_index = table_index(entry.codes)
+            records += self.ENTRY_RECORD.pack(
+                name_index, entry.size, entry.compressed_size, entry.offset,
+                entry.metadata.get('mtime', 0.0), entry.metadata.get('atime', 0.0),
+                entry.metadata.get('mode', 0), entry.padding, flags, codes_index,
+                len(entry.blocks) if entry.blocks is not None else 0,
+                bytes.fromhex(entry.metadata.get('digest', '')))
+        f.write(self.DIRECTORY_HEADER.pack(len(file_entries), len(names), len(tables), block_count))
+        for name in names:
+            encoded = name.encode('utf-8')
+            f.write(len(encoded).to_bytes(2, 'big'))
+            f.write(encoded)
+        for table in tables:
+            f.write(len(table).to_bytes(4, 'big'))
+            f.write(table)
+        f.write(records)
+        f.write(block_records)
+        self._write_footer(f, directory_offset, len(file_entries))
+
+    def _write_footer(self, f, directory_offset: int, file_count: int):
+        f.write(directory_offset.to_bytes(8, 'big'))
+        f.write(file_count.to_bytes(4, 'big'))
+        f.write(self.FOOTER_MAGIC)
+
+    def _write_json_directory(self, f, file_entries: List[FileEntry]):
+        directory_offset = f.tell()
+        for entry in file_entries:
+            file_header = {
+                'filename': entry.filename,
+                'size': entry.size,
+                'compressed_size': entry.compressed_size,
+                'metadata': entry.metadata,
+                'padding': entry.padding,
+                'offset': entry.offset,
+                'method': entry.method
+            }
+            if entry.blocks is not None:
+                file_header['blocks'] = [[block.size, block.compressed_size, block.padding]
+                                         for block in entry.blocks]
+                codes_data = b''.join(self.compressor._serialize_codes(block.codes) for block in entry.blocks)
+            else:
+                codes_data = self.compressor._serialize_codes(entry.codes)
+            header_data = json.dumps(file_header).encode('utf-8')
+            f.write(len(header_data).to_bytes(4, 'big'))
+            f.write(header_data)
+            f.write(len(codes_data).to_bytes(4, 'big'))
+            f.write(codes_data)
+        self._write_footer(f, directory_offset, len(file_entries))
+
+    def _collect_files(self, paths: List[str]) -> List[str]:
+        return list(self._iter_files(paths))
+
+    def _iter_files(self, paths: List[str]) -> Iterator[str]:
+        for path in paths:
+            if path == '-' or os.path.isfile(path):
+                yield path
+            elif os.path.isdir(path):
+                stack = [path]
+                while stack:
+                    subdirs = []
+                    with os.scandir(stack.pop()) as entries:
+                        for entry in entries:
+                            if entry.is_dir():
+                                if not entry.is_symlink():
+                                    subdirs.append(entry.path)
+                            else:
+                                yield entry.path
+                    stack.extend(reversed(subdirs))
+
+    def _write_pipeline(self, f, files: Iterable[str], file_entries: List[FileEntry],
+                        executor: Optional[ProcessPoolExecutor]):
+        stats = self.pipeline_stats = PipelineStats()
+        paths = queue.Queue(self.QUEUE_SIZE)
+        reads = queue.Queue(self.QUEUE_SIZE)
+        encoded = queue.Queue(self.QUEUE_SIZE)
+        window = ReadWindow(self.QUEUE_SIZE * 3, self.READ_AHEAD_BYTES)
+        stop = threading.Event()
+        settings = self._job_settings()
+
+        def put(target: queue.Queue, item) -> bool:
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=self.POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(source: queue.Queue):
+            while not stop.is_set():
+                try:
+                    return source.get(timeout=self.POLL_INTERVAL)
+                except queue.Empty:
+                    pass
+            return None
+
+        def scan():
+            sequence = 0
+            iterator = iter(files)
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    filepath = next(iterator, None)
+                    stats.add_time('scan', time.perf_counter() - start)
+                    if filepath is None:
+                        break
+                    try:
+                        size = os.stat(filepath).st_size
+                    except OSError:
+                        size = 0
+                    while not window.acquire(sequence, size, self.POLL_INTERVAL):
+                        if stop.is_set():
+                            return
+                    if not put(paths, (sequence, filepath, None)):
+                        return
+                    stats.sample('paths', paths.qsize())
+                    sequence += 1
+            except Exception as e:
+                put(paths, (sequence, None, e))
+            for _ in range(self.READ_THREADS):
+                put(paths, None)
+
+        def read():
+            while True:
+                item = get(paths)
+                if item is None:
+                    put(reads, None)
+                    return
+                sequence, filepath, error = item
+                data = metadata = None
+                start = time.perf_counter()
+                if error is None:
+                    try:
+                        metadata = self._get_file_metadata(filepath)
+                        with open(filepath, 'rb') as source:
+                            data = source.read()
+                        metadata['digest'] = hashlib.blake2b(data, digest_size=self.DIGEST_SIZE).hexdigest()
+                    except Exception as e:
+                        error = e
+                elapsed = time.perf_counter() - start
+                stats.add_time('read', elapsed)
+                self.instrumentation.add_time('read', elapsed)
+                if not put(reads, (sequence, filepath, metadata, data, error)):
+                    return
+                stats.sample('reads', reads.qsize())
+
+        def encode():
+            finished = 0
+            while finished < self.READ_THREADS and not stop.is_set():
+                item = get(reads)
+                if item is None:
+                    finished += 1
+                    continue
+                sequence, filepath, metadata, data, error = item
+                result = None
+                if error is None:
+                    try:
+                        if executor:
+                            result = executor.submit(_encode_job, data, settings)
+                        else:
+                            result = _encode_job(data, settings, self.compressor)
+                    except Exception as e:
+                        error = e
+                if not put(encoded, (sequence, filepath, metadata, len(data or b''), result, error)):
+                    return
+                stats.sample('encoded', encoded.qsize())
+            put(encoded, None)
+
+        if executor:
+            executor.submit(int).result()
+        threads = [threading.Thread(target=scan, daemon=True), threading.Thread(target=encode, daemon=True)]
+        threads += [threading.Thread(target=read, daemon=True) for _ in range(self.READ_THREADS)]
+        for thread in threads:
+            thread.start()
+        pending = {}
+        next_sequence = 0
+        try:
+            while True:
+                item = encoded.get()
+                if item is None:
+                    break
+                pending[item[0]] = item
+                while next_sequence in pending:
+                    _, filepath, metadata, size, result, error = pending.pop(next_sequence)
+                    if error is not None:
+                        raise error
+                    compressed_data, codes, padding, method, elapsed = result.result() if executor else result
+                    stats.add_time('encode', elapsed)
+                    if executor:
+                        self.instrumentation.add_time('encode', elapsed)
+                    start = time.perf_counter()
+                    file_entries.append(FileEntry(
+                        filename=os.path.basename(filepath),
+                        size=size,
+                        compressed_size=len(compressed_data),
+                        metadata=metadata,
+                        codes=codes,
+                        padding=padding,
+                        offset=f.tell(),
+                        method=method
+                    ))
+                    f.write(compressed_data)
+                    elapsed = time.perf_counter() - start
+                    stats.add_time('write', elapsed)
+                    self.instrumentation.add_time('write', elapsed)
+                    window.release(next_sequence)
+                    next_sequence += 1
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            stats.max_read_ahead = window.peak
+            if executor:
+                while not encoded.empty():
+                    item = encoded.get_nowait()
+                    if item is not None:
+                        pending[item[0]] = item
+                for item in pending.values():
+                    if item[4] is not None:
+                        item[4].cancel()
+
+    def _print_pipeline_stats(self):
+        summary = self.pipeline_stats.summary()
+        print("Конвейер, время стадий (с): " + ", ".join(
+            f"{stage} {seconds:.3f}" for stage, seconds in summary['stage_time'].items()))
+        print("Конвейер, глубина очередей (средняя/макс.): " + ", ".join(
+            f"{name} {summary['mean_depth'][name]:.1f}/{summary['max_depth'][name]}" for name in PipelineStats.QUEUES))
+        print(f"Конвейер, максимум прочитанного вперед: {summary['max_read_ahead']} байт")
+
+    def _read_chunks(self, filepath: str, chunk_size: int) -> Iterator[bytes]:
         with open(filepath, 'rb') as f:
+            while True:
+                with self.instrumentation.timer('read'):
+                    chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def _scan_file(self, filepath: str, chunk_size: int) -> FileEntry:
+        metadata = self._get_file_metadata(filepath)
+        entry = FileEntry(
+            filename=os.path.basename(filepath),
+            size=metadata['size'],
+            compressed_size=metadata['size'],
+            metadata=metadata,
+            codes={},
+            padding=0,
+            source=filepath,
+            method=self.METHOD_STORED
+        )
+        if metadata['size'] > self.PROBE_SIZE:
+            probe = _read_range(filepath, 0, self.PROBE_SIZE)
+            if self.compressor.estimated_size(self.compressor.calculate_frequencies(probe)) >= len(probe):
+                metadata['digest'] = _file_digest(filepath, chunk_size)
+                return entry
+        digest = hashlib.blake2b(digest_size=self.DIGEST_SIZE)
+        frequencies = self.compressor.calculate_stream_frequencies(
+            _hashed_chunks(self._read_chunks(filepath, chunk_size), digest))
+        metadata['digest'] = digest.hexdigest()
+        entry.size = entry.compressed_size = self.compressor.decoded_size(frequencies)
+        if frequencies:
+            codes = self.compressor.choose_codes(frequencies)
+            if self.compressor.worth_encoding(frequencies, codes):
+                entry.compressed_size, entry.padding = self.compressor.encoded_size(frequencies, codes)
+                entry.codes = dict(codes)
+                entry.method = self.METHOD_SHANNON_FANO
+        return entry
+
+    def _entry_chunks(self, entry: FileEntry, chunk_size: int) -> Iterator[bytes]:
+        digest = hashlib.blake2b(digest_size=self.DIGEST_SIZE)
+        chunks = _hashed_chunks(self._read_chunks(entry.source, chunk_size), digest)
+        if entry.method != self.METHOD_STORED:
+            chunks = self.compressor.compress_stream(chunks, entry.codes)
+        written = 0
+        for chunk in chunks:
+            written += len(chunk)
+            yield chunk
+        if written != entry.compressed_size or digest.hexdigest() != entry.metadata['digest']:
+            raise ValueError(f"файл {entry.source} изменился во время архивации")
+
+    def _write_stream(self, f, entry: FileEntry, chunk_size: int):
+        for chunk in self._entry_chunks(entry, chunk_size):
+            with self.instrumentation.timer('write'):
+                f.write(chunk)
+
+    def _write_adaptive(self, f, filepath: str) -> FileEntry:
+        if filepath == '-':
+            now = time.time()
+            source = sys.stdin.buffer
+            metadata = {'mtime': now, 'atime': now, 'mode': 0o100644}
+            filename = self.STDIN_NAME
+        else:
+            source = open(filepath, 'rb')
+            metadata = self._get_file_metadata(filepath)
+            filename = os.path.basename(filepath)
+        entry = FileEntry(filename, 0, 0, metadata, {}, 0, source=filepath, offset=f.tell(),
+                          method=self.METHOD_ADAPTIVE)
+        digest = hashlib.blake2b(digest_size=self.DIGEST_SIZE)
+
+        def chunks() -> Iterator[bytes]:
+            while True:
+                with self.instrumentation.timer('read'):
+                    chunk = source.read(self.CHUNK_SIZE)
+                if not chunk:
+                    return
+                digest.update(chunk)
+                entry.size += len(chunk)
+                yield chunk
+
+        try:
+            for data in self.compressor.compress_adaptive(chunks()):
+                with self.instrumentation.timer('write'):
+                    f.write(data)
+                entry.compressed_size += len(data)
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+        metadata['size'] = entry.size
+        metadata['digest'] = digest.hexdigest()
+        return entry
+
+    def _process_file(self, filepath: str, file_entries: List, out):
+        with self.instrumentation.timer('read'), open(filepath, 'rb') as f:
             data = f.read()
         metadata = self._get_file_metadata(filepath)
-        compressed_data, codes, padding = self.compressor.compress_data(data)
+        metadata['digest'] = hashlib.blake2b(data, digest_size=self.DIGEST_SIZE).hexdigest()
+        compressed_data, codes, padding, method = _encode_or_store(self.compressor, data)
         file_entries.append(FileEntry(
             filename=os.path.basename(filepath),
             size=len(data),
             compressed_size=len(compressed_data),
             metadata=metadata,
             codes=codes,
-            padding=padding
+            padding=padding,
+            offset=out.tell(),
+            method=method
         ))
-        all_compressed_data.extend(compressed_data)
+        with self.instrumentation.timer('write'):
+            out.write(compressed_data)
 
-    def _process_directory(self, directory: str, file_entries: List, all_compressed_data: bytearray):
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                filepath = os.path.join(root, file)
-                self._process_file(filepath, file_entries, all_compressed_data)
+    def _count_entries(self, file_entries: List[FileEntry], original: str, compressed: str):
+        if self.instrumentation.enabled:
+            self.instrumentation.count('files', len(file_entries))
+            self.instrumentation.count(original, sum(entry.size for entry in file_entries))
+            self.instrumentation.count(compressed, sum(entry.compressed_size for entry in file_entries))
 
     def _print_statistics(self, file_entries: List[FileEntry]):
         print("\nСтатистика сжатия:")
@@ -115,9 +809,15 @@ class FileArchiver:
                 ratio = (1 - entry.compressed_size / entry.size) * 100
             total_original += entry.size
             total_compressed += entry.compressed_size
+            if self.quiet:
+                continue
             print(f"{entry.filename}:")
             print(f"Исходный: {entry.size} байт")
             print(f"Сжатый: {entry.compressed_size} байт")
+            if entry.method == self.METHOD_STORED:
+                print("Сохранен без сжатия")
+            elif entry.method == self.METHOD_ADAPTIVE:
+                print("Адаптивный режим")
             print(f"Сжатие: {ratio:.1f}%")
             print()
         if total_original == 0:
@@ -127,75 +827,540 @@ class FileArchiver:
 
         print(f"В итоге: {total_original} => {total_compressed} байт ({total_ratio:.1f}%)")
 
-    def decompress_file(self, input_path: str, password: Optional[str] = None) -> bool:
+    @contextmanager
+    def _open_mapped(self, path: str) -> Iterator[mmap.mmap]:
+        with open(path, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                yield f
+                return
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield source
+            except BaseException as e:
+                import traceback
+                traceback.clear_frames(e.__traceback__)
+                raise
+            finally:
+                source.close()
+
+    def _read_view(self, source, size: int):
+        if isinstance(source, mmap.mmap):
+            start = source.tell()
+            end = min(start + size, len(source))
+            source.seek(end)
+            return memoryview(source)[start:end]
+        return source.read(size)
+
+    def _open_archive(self, f, password: Optional[str]) -> Optional[List[FileEntry]]:
+        signature = f.read(4)
+        if signature not in (self.SIGNATURE, self.JSON_SIGNATURE, self.LEGACY_SIGNATURE, self.BLOCK_SIGNATURE):
+            print("Ошибка: неверный формат файла")
+            return None
+        access_size = int.from_bytes(f.read(4), 'big')
+        access_data = f.read(access_size)
+        access_header = json.loads(access_data.decode('utf-8'))
+        if access_header['password_protected'] and not self._check_password(access_header, password):
+            return None
+        if signature in (self.SIGNATURE, self.JSON_SIGNATURE):
+            f.seek(-self.FOOTER_SIZE, os.SEEK_END)
+            directory_end = f.tell()
+            footer = f.read(self.FOOTER_SIZE)
+            if footer[12:] != self.FOOTER_MAGIC:
+                print("Ошибка: не найден каталог архива")
+                return None
+            directory_offset = int.from_bytes(footer[:8], 'big')
+            f.seek(directory_offset)
+            if signature == self.SIGNATURE:
+                with self.instrumentation.timer('directory'):
+                    return self._read_directory(self._read_view(f, directory_end - directory_offset))
+            return self._read_headers(f, int.from_bytes(footer[8:12], 'big'))
+        file_entries = self._read_headers(f, access_header['file_count'])
+        data_offset = f.tell()
+        for entry in file_entries:
+            entry.offset = data_offset
+            data_offset += entry.compressed_size
+        return file_entries
+
+    def _check_password(self, access_header: Dict, password: Optional[str]) -> bool:
+        password_hash = bytes.fromhex(access_header['password_hash'])
+        iterations = access_header.get('kdf_iterations', AccessControl.ITERATIONS)
+        attempts = 1 if password else self.PASSWORD_ATTEMPTS
+        for _ in range(attempts):
+            if not password:
+                password = input("Введите пароль для распаковки: ")
+            if self.access_control.verify_password(password, password_hash, iterations):
+                print("Пароль верный, распаковываю...")
+                return True
+            print("Ошибка: неверный пароль")
+            password = None
+        return False
+
+    def _read_directory(self, data) -> List[FileEntry]:
+        entry_count, name_count, table_count, block_count = self.DIRECTORY_HEADER.unpack_from(data, 0)
+        offset = self.DIRECTORY_HEADER.size
+        names = []
+        for _ in range(name_count):
+            length = int.from_bytes(data[offset:offset + 2], 'big')
+            names.append(bytes(data[offset + 2:offset + 2 + length]).decode('utf-8'))
+            offset += 2 + length
+        tables = []
+        for _ in range(table_count):
+            length = int.from_bytes(data[offset:offset + 4], 'big')
+            tables.append(self.decompressor._deserialize_canonical_codes(data[offset + 4:offset + 4 + length])[0])
+            offset += 4 + length
+        records = list(self.ENTRY_RECORD.iter_unpack(data[offset:offset + entry_count * self.ENTRY_RECORD.size]))
+        offset += entry_count * self.ENTRY_RECORD.size
+        block_records = list(self.BLOCK_RECORD.iter_unpack(data[offset:offset + block_count * self.BLOCK_RECORD.size]))
+        file_entries = []
+        for (name_index, size, compressed_size, data_offset, mtime, atime, mode,
+             padding, flags, codes_index, entry_blocks, digest) in records:
+            metadata = {'size': size, 'mtime': mtime, 'atime': atime, 'mode': mode}
+            if any(digest):
+                metadata['digest'] = digest.hex()
+            blocks = None
+            codes = {}
+            method = self.METHOD_SHANNON_FANO
+            if flags & self.ENTRY_STORED:
+                method = self.METHOD_STORED
+            elif flags & self.ENTRY_ADAPTIVE:
+                method = self.METHOD_ADAPTIVE
+            if flags & self.ENTRY_BLOCKS:
+                blocks = []
+                block_offset = 0
+                for block_size, block_compressed, block_padding, block_method, table in \
+                        block_records[codes_index:codes_index + entry_blocks]:
+                    block_codes = tables[table] if block_method == self.METHOD_SHANNON_FANO else {}
+                    blocks.append(BlockEntry(block_offset, block_size, block_compressed, block_codes,
+                                             block_padding, block_method))
+                    block_offset += block_compressed
+            elif method == self.METHOD_SHANNON_FANO:
+                codes = tables[codes_index]
+            file_entries.append(FileEntry(names[name_index], size, compressed_size, metadata,
+                                          codes, padding, blocks=blocks, offset=data_offset, method=method))
+        return file_entries
+
+    def _read_headers(self, f, file_count: int) -> List[FileEntry]:
+        file_entries = []
+        for i in range(file_count):
+            header_size_bytes = f.read(4)
+            if len(header_size_bytes) < 4:
+                break
+            header_size = int.from_bytes(header_size_bytes, 'big')
+            header_data = self._read_view(f, header_size)
+            if len(header_data) < header_size:
+                break
+            file_info = json.loads(bytes(header_data).decode('utf-8'))
+            codes_size_bytes = f.read(4)
+            if len(codes_size_bytes) < 4:
+                break
+            codes_size = int.from_bytes(codes_size_bytes, 'big')
+            codes_data = self._read_view(f, codes_size)
+            if len(codes_data) < codes_size:
+                break
+            blocks = None
+            codes = {}
+            if 'blocks' in file_info:
+                blocks = []
+                codes_offset = 0
+                block_offset = 0
+                for size, compressed_size, padding in file_info['blocks']:
+                    block_codes, used = self.decompressor._deserialize_codes(codes_data[codes_offset:])
+                    codes_offset += used
+                    blocks.append(BlockEntry(block_offset, size, compressed_size, block_codes, padding))
+                    block_offset += compressed_size
+            else:
+                codes, _ = self.decompressor._deserialize_codes(codes_data)
+            file_entries.append(FileEntry(
+                filename=file_info['filename'],
+                size=file_info['size'],
+                compressed_size=file_info['compressed_size'],
+                metadata=file_info['metadata'],
+                codes=codes,
+                padding=file_info['padding'],
+                blocks=blocks,
+                offset=file_info.get('offset', 0),
+                method=file_info.get('method', self.METHOD_SHANNON_FANO)
+            ))
+        return file_entries
+
+    def decompress_file(self, input_path: str, password: Optional[str] = None, jobs: int = 1) -> bool:
+        executor = None
         try:
-            with open(input_path, 'rb') as f:
-                signature = f.read(4)
-                if signature != self.SIGNATURE:
-                    print("Ошибка: неверный формат файла")
+            with self._open_mapped(input_path) as f:
+                file_entries = self._open_archive(f, password)
+                if file_entries is None:
                     return False
-                access_size = int.from_bytes(f.read(4), 'big')
-                access_data = f.read(access_size)
-                access_header = json.loads(access_data.decode('utf-8'))
-                if access_header['password_protected']:
-                    if not password:
-                        password = input("Введите пароль для распаковки: ")
-                    password_hash = bytes.fromhex(access_header['password_hash'])
-                    if not self.access_control.verify_password(password, password_hash):
-                        print("Ошибка: неверный пароль")
-                        return False
-                    print("Пароль верный, распаковываю...")
-                file_entries = []
-                total_compressed_size = 0
-                for i in range(access_header['file_count']):
-                    header_size_bytes = f.read(4)
-                    if len(header_size_bytes) < 4:
-                        break
-                    header_size = int.from_bytes(header_size_bytes, 'big')
-                    header_data = f.read(header_size)
-                    if len(header_data) < header_size:
-                        break
-                    file_info = json.loads(header_data.decode('utf-8'))
-                    codes_size_bytes = f.read(4)
-                    if len(codes_size_bytes) < 4:
-                        break
-                    codes_size = int.from_bytes(codes_size_bytes, 'big')
-                    codes_data = f.read(codes_size)
-                    if len(codes_data) < codes_size:
-                        break
-                    codes, _ = self.decompressor._deserialize_codes(codes_data)
-                    file_info['codes'] = codes
-                    file_entries.append(file_info)
-                    total_compressed_size += file_info['compressed_size']
-                current_pos = f.tell()
-                compressed_data = f.read()
-                self._extract_files(file_entries, compressed_data)
+                if jobs > 1:
+                    executor = ProcessPoolExecutor(max_workers=jobs)
+                    self._extract_parallel(input_path, file_entries, executor, jobs)
+                else:
+                    self._extract_files(f, file_entries)
+                self._count_entries(file_entries, 'bytes_out', 'bytes_in')
                 return True
         except Exception as e:
             print(f"Ошибка при распаковке: {e}")
             import traceback
             traceback.print_exc()
             return False
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
 
-    def _extract_files(self, file_entries: List[Dict], compressed_data: bytes):
-        data_offset = 0
-        for file_info in file_entries:
-            try:
-                file_compressed_data = compressed_data[data_offset:data_offset + file_info['compressed_size']]
-                decompressed = self.decompressor.decompress_data(
-                    file_compressed_data,
-                    file_info['codes'],
-                    file_info['padding'],
-                    file_info['size']
-                )
-                filename = file_info['filename']
-                os.makedirs(os.path.dirname(filename) if os.path.dirname(filename) else '.', exist_ok=True)
-                with open(filename, 'wb') as out_file:
+    def extract(self, archive_path: str, member: str, password: Optional[str] = None,
+                output_path: Optional[str] = None) -> bool:
+        try:
+            with self._open_mapped(archive_path) as f:
+                file_entries = self._open_archive(f, password)
+                if file_entries is None:
+                    return False
+                for entry in file_entries:
+                    if entry.filename == member:
+                        self._create_directories([output_path or member])
+                        self._extract_member(f, entry, output_path or member)
+                        return True
+                print(f"Ошибка: {member} нет в архиве")
+                return False
+        except Exception as e:
+            print(f"Ошибка при распаковке: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def list_archive(self, archive_path: str, password: Optional[str] = None) -> bool:
+        try:
+            with self._open_mapped(archive_path) as f:
+                file_entries = self._open_archive(f, password)
+            if file_entries is None:
+                return False
+        except Exception as e:
+            print(f"Ошибка при чтении архива: {e}")
+            return False
+        print(f"{'Размер':>12} {'Сжатый':>12} {'Сжатие':>7}  {'Метод':<10} Имя")
+        for entry in file_entries:
+            if entry.blocks is not None:
+                method = f"блоки:{len(entry.blocks)}"
+            else:
+                method = {self.METHOD_STORED: 'stored', self.METHOD_ADAPTIVE: 'adaptive'}.get(entry.method, 'sf')
+            print(f"{entry.size:>12} {entry.compressed_size:>12} {self._ratio(entry.size, entry.compressed_size):>6.1f}%"
+                  f"  {method:<10} {entry.filename}")
+        total_original = sum(entry.size for entry in file_entries)
+        total_compressed = sum(entry.compressed_size for entry in file_entries)
+        print(f"{total_original:>12} {total_compressed:>12} {self._ratio(total_original, total_compressed):>6.1f}%"
+              f"  {'':<10} файлов: {len(file_entries)}")
+        return True
+
+    def _ratio(self, size: int, compressed_size: int) -> float:
+        return (1 - compressed_size / size) * 100 if size else 0.0
+
+    def test_archive(self, archive_path: str, password: Optional[str] = None, jobs: int = 1) -> bool:
+        executor = None
+        try:
+            with self._open_mapped(archive_path) as f:
+                file_entries = self._open_archive(f, password)
+                if file_entries is None:
+                    return False
+                if jobs > 1:
+                    executor = ProcessPoolExecutor(max_workers=jobs)
+                    results = self._ordered_map(executor, _verify_entry_job,
+                                                ((archive_path, entry) for entry in file_entries), jobs)
+                else:
+                    results = (self._verify_entry(f, entry) for entry in file_entries)
+                failed = 0
+                unchecked = 0
+                for entry, error in zip(file_entries, results):
+                    if error is not None:
+                        failed += 1
+                        print(f"ОШИБКА: {entry.filename}: {error}")
+                        continue
+                    unchecked += 'digest' not in entry.metadata
+                    if not self.quiet:
+                        print(f"OK: {entry.filename}")
+            print(f"Проверено файлов: {len(file_entries)}, ошибок: {failed}"
+                  + (f", без контрольной суммы (проверен только размер): {unchecked}" if unchecked else ""))
+            return failed == 0
+        except Exception as e:
+            print(f"Ошибка при проверке: {e}")
+            return False
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+    def _verify_entry(self, f, entry: FileEntry) -> Optional[str]:
+        if entry.offset + entry.compressed_size > len(f):
+            return "сжатые данные выходят за конец архива"
+        digest = hashlib.blake2b(digest_size=self.DIGEST_SIZE)
+        size = 0
+        try:
+            for chunk in self._read_member(f, entry, self.quiet_decompressor):
+                digest.update(chunk)
+                size += len(chunk)
+        except Exception as e:
+            return f"ошибка декодирования: {e}"
+        if size != entry.size:
+            return f"размер {size} вместо {entry.size}"
+        expected = entry.metadata.get('digest')
+        if expected is not None and digest.hexdigest() != expected:
+            return "контрольная сумма не совпадает"
+        return None
+
+    def open(self, archive_path: str, member: str, password: Optional[str] = None,
+             chunk_size: int = CHUNK_SIZE) -> MemberReader:
+        source = open(archive_path, 'rb')
+        try:
+            file_entries = self._open_archive(source, password)
+            if file_entries is None:
+                raise ValueError(f"не удалось открыть архив {archive_path}")
+            for entry in file_entries:
+                if entry.filename == member:
+                    return MemberReader(source, self.iter_decompress(source, entry, chunk_size))
+            raise KeyError(member)
+        except BaseException:
+            source.close()
+            raise
+
+    def iter_decompress(self, f, entry: FileEntry, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        if entry.blocks is None:
+            yield from self._iter_range(f, entry.offset, entry.compressed_size, entry.codes, entry.padding,
+                                        entry.size, entry.method, chunk_size)
+            return
+        for block in entry.blocks:
+            yield from self._iter_range(f, entry.offset + block.offset, block.compressed_size, block.codes,
+                                        block.padding, block.size, block.method, chunk_size)
+
+    def _iter_range(self, f, offset: int, compressed_size: int, codes: Dict[int, str], padding: int,
+                    size: int, method: int, chunk_size: int) -> Iterator[bytes]:
+        chunks = self._compressed_chunks(f, offset, compressed_size, chunk_size)
+        if method == self.METHOD_STORED:
+            for chunk in chunks:
+                yield bytes(chunk)
+            return
+        if method == self.METHOD_ADAPTIVE:
+            yield from self.decompressor.iter_decompress_adaptive(chunks, size, chunk_size)
+            return
+        yield from self.decompressor.iter_decompress_stream(chunks, compressed_size, codes, padding, size, chunk_size)
+
+    def _compressed_chunks(self, f, offset: int, compressed_size: int, chunk_size: int) -> Iterator[bytes]:
+        f.seek(offset)
+        remaining = compressed_size
+        while remaining > 0:
+            chunk = self._read_view(f, min(chunk_size, remaining))
+            if not chunk:
+                raise ValueError("архив обрезан")
+            remaining -= len(chunk)
+            yield chunk
+
+    def _read_member(self, f, entry: FileEntry,
+                     decompressor: Optional[ShannonFanoDecompressor] = None) -> Iterator[bytes]:
+        decompressor = decompressor or self.decompressor
+        if entry.blocks is not None:
+            for block in entry.blocks:
+                f.seek(entry.offset + block.offset)
+                yield _decode_block_job(self._read_view(f, block.compressed_size), block.codes, block.padding,
+                                        block.size, block.method, decompressor)
+        elif entry.method == self.METHOD_STORED:
+            f.seek(entry.offset)
+            data = self._read_view(f, entry.compressed_size)
+            for start in range(0, len(data), self.CHUNK_SIZE):
+                yield bytes(data[start:start + self.CHUNK_SIZE])
+        elif entry.method == self.METHOD_ADAPTIVE:
+            f.seek(entry.offset)
+            yield from decompressor.iter_decompress_adaptive(
+                (self._read_view(f, entry.compressed_size),), entry.size, self.CHUNK_SIZE)
+        else:
+            f.seek(entry.offset)
+            yield from decompressor.iter_decompress_data(
+                self._read_view(f, entry.compressed_size),
+                entry.codes,
+                entry.padding,
+                entry.size,
+                self.CHUNK_SIZE
+            )
+
+    def _extract_member(self, f, entry: FileEntry, filename: str):
+        written = 0
+        with open(filename, 'wb') as out_file:
+            for decompressed in self._read_member(f, entry):
+                with self.instrumentation.timer('write'):
                     out_file.write(decompressed)
-                print(f"Распакован: {filename} ({len(decompressed)}/{file_info['size']} байт)")
-                data_offset += file_info['compressed_size']
+                written += len(decompressed)
+        if not self.quiet:
+            print(f"Распакован: {filename} ({written}/{entry.size} байт)")
+
+    def _extract_files(self, f, file_entries: List[FileEntry]):
+        self._create_directories(entry.filename for entry in file_entries)
+        for entry in file_entries:
+            try:
+                self._extract_member(f, entry, entry.filename)
             except Exception as e:
-                print(f"Ошибка при обработке файла {file_info['filename']}: {e}")
+                print(f"Ошибка при обработке файла {entry.filename}: {e}")
                 import traceback
                 traceback.print_exc()
-                continue
\ No newline at end of file
+                continue
+
+    def _create_directories(self, filenames: Iterable[str]):
+        for directory in sorted({os.path.dirname(filename) for filename in filenames} - {''}):
+            os.makedirs(directory, exist_ok=True)
+
+    def _extract_parallel(self, archive_path: str, file_entries: List[FileEntry],
+                          executor: ProcessPoolExecutor, jobs: int):
+        self._create_directories(entry.filename for entry in file_entries)
+        targets = []
+        tasks = []
+        for entry in file_entries:
+            if entry.blocks is None:
+                targets.append((entry.filename, None))
+                tasks.append((archive_path, entry.offset, entry.compressed_size, entry.codes,
+                              entry.padding, entry.size, entry.method))
+                continue
+            open(entry.filename, 'wb').close()
+            position = 0
+            for block in entry.blocks:
+                targets.append((entry.filename, position))
+                tasks.append((archive_path, entry.offset + block.offset, block.compressed_size, block.codes,
+                              block.padding, block.size, block.method))
+                position += block.size
+        failed = set()
+        with ThreadPoolExecutor(max_workers=self.WRITE_THREADS) as writer:
+            writes = deque()
+            decoded = self._ordered_map(executor, _decode_range_result, tasks, jobs)
+            for (filename, position), (data, error) in zip(targets, decoded):
+                if filename in failed:
+                    continue
+                if error is not None:
+                    self._report_failure(filename, error, failed)
+                    continue
+                writes.append((filename, writer.submit(_write_output, filename, position, data)))
+                while len(writes) > self.WRITE_THREADS * self.IN_FLIGHT_PER_JOB:
+                    self._finish_write(*writes.popleft(), failed)
+            while writes:
+                self._finish_write(*writes.popleft(), failed)
+        if not self.quiet:
+            for entry in file_entries:
+                if entry.filename not in failed:
+                    print(f"Распакован: {entry.filename} ({entry.size} байт)")
+
+    def _finish_write(self, filename: str, future, failed: set):
+        try:
+            future.result()
+        except Exception as e:
+            self._report_failure(filename, e, failed)
+
+    def _report_failure(self, filename: str, error: Exception, failed: set):
+        if filename not in failed:
+            failed.add(filename)
+            print(f"Ошибка при обработке файла {filename}: {error}")
+
+
+_job_table_cache: Optional[CodeTableCache] = None
+_job_archive: Optional[Tuple[str, mmap.mmap]] = None
+
+
+def _file_digest(filepath: str, chunk_size: int) -> str:
+    digest = hashlib.blake2b(digest_size=FileArchiver.DIGEST_SIZE)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hashed_chunks(chunks: Iterable[bytes], digest) -> Iterator[bytes]:
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def _read_range(filepath: str, offset: int, length: int) -> bytes:
+    with open(filepath, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def _job_compressor(settings: Tuple[int, Optional[Dict[int, str]], int]) -> ShannonFanoCompressor:
+    global _job_table_cache
+    symbol_bits, shared_codes, cache_size = settings
+    table_cache = None
+    if cache_size:
+        if _job_table_cache is None or _job_table_cache.capacity != cache_size:
+            _job_table_cache = CodeTableCache(cache_size)
+        table_cache = _job_table_cache
+    return ShannonFanoCompressor(canonical=True, symbol_bits=symbol_bits,
+                                 table_cache=table_cache, shared_codes=shared_codes)
+
+
+def _compress_file_job(filepath: str, chunk_size: int,
+                       settings: Tuple[int, Optional[Dict[int, str]], int] = (8, None, 0)) -> Tuple[FileEntry, bytes]:
+    archiver = FileArchiver()
+    archiver.compressor = _job_compressor(settings)
+    entry = archiver._scan_file(filepath, chunk_size)
+    return entry, b''.join(archiver._entry_chunks(entry, chunk_size))
+
+
+def _compress_block_job(filepath: str, offset: int, length: int,
+                        settings: Tuple[int, Optional[Dict[int, str]], int] = (8, None, 0)
+                        ) -> Tuple[int, Dict[int, str], int, bytes, int]:
+    data = _read_range(filepath, offset, length)
+    compressed_data, codes, padding, method = _encode_or_store(_job_compressor(settings), data)
+    return len(data), codes, padding, compressed_data, method
+
+
+def _mapped_archive(archive_path: str) -> mmap.mmap:
+    global _job_archive
+    if _job_archive is None or _job_archive[0] != archive_path:
+        with open(archive_path, 'rb') as f:
+            _job_archive = (archive_path, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    return _job_archive[1]
+
+
+def _decode_range_job(archive_path: str, offset: int, compressed_size: int, codes: Dict[int, str],
+                      padding: int, size: int, method: int) -> bytes:
+    data = memoryview(_mapped_archive(archive_path))[offset:offset + compressed_size]
+    try:
+        return _decode_block_job(data, codes, padding, size, method)
+    finally:
+        data.release()
+
+
+def _decode_range_result(*args) -> Tuple[Optional[bytes], Optional[Exception]]:
+    try:
+        return _decode_range_job(*args), None
+    except Exception as e:
+        return None, e
+
+
+def _verify_entry_job(archive_path: str, entry: FileEntry) -> Optional[str]:
+    return FileArchiver(quiet=True)._verify_entry(_mapped_archive(archive_path), entry)
+
+
+def _write_output(filename: str, position: Optional[int], data: bytes):
+    with open(filename, 'wb' if position is None else 'r+b') as f:
+        if position:
+            f.seek(position)
+        f.write(data)
+
+
+def _encode_job(data: bytes, settings: Tuple[int, Optional[Dict[int, str]], int],
+                compressor: Optional[ShannonFanoCompressor] = None) -> Tuple[bytes, Dict[int, str], int, int, float]:
+    start = time.perf_counter()
+    compressed_data, codes, padding, method = _encode_or_store(compressor or _job_compressor(settings), data)
+    return compressed_data, codes, padding, method, time.perf_counter() - start
+
+
+def _encode_or_store(compressor: ShannonFanoCompressor, data: bytes) -> Tuple[bytes, Dict[int, str], int, int]:
+    frequencies = compressor.calculate_frequencies(data) if data else {}
+    if frequencies:
+        codes = compressor.choose_codes(frequencies)
+        if compressor.worth_encoding(frequencies, codes):
+            compressed_data, padding = compressor.encode_data(data, frequencies, codes)
+            return compressed_data, dict(codes), padding, FileArchiver.METHOD_SHANNON_FANO
+    return bytes(data), {}, 0, FileArchiver.METHOD_STORED
+
+
+def _decode_block_job(compressed_data: bytes, codes: Dict[int, str], padding: int, size: int,
+                      method: int = FileArchiver.METHOD_SHANNON_FANO,
+                      decompressor: Optional[ShannonFanoDecompressor] = None) -> bytes:
+    if method == FileArchiver.METHOD_STORED:
+        return bytes(compressed_data)
+    decompressor = decompressor or ShannonFanoDecompressor(quiet=True)
+    if method == FileArchiver.METHOD_ADAPTIVE:
+        return b''.join(decompressor.iter_decompress_adaptive((compressed_data,), size, max(size, 1)))
+    return decompressor._decompress(compressed_data, codes, padding, size)
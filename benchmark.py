@@ -0,0 +1,325 @@
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from archiver import FileArchiver, FileEntry
+from compressor import ShannonFanoCompressor
+from decompressor import DECODER_CACHE, ShannonFanoDecompressor
+import numpy_backend
+
+SEED = 20240601
+SIZES = {
+    'quick': {'data': 1 << 18, 'small_files': 200, 'huge': 1 << 21, 'entries': 10000, 'repeat': 1},
+    'full': {'data': 1 << 22, 'small_files': 5000, 'huge': 1 << 25, 'entries': 100000, 'repeat': 3},
+}
+DATA_CORPORA = ('text', 'skewed', 'uniform')
+FILE_CORPORA = ('small_files', 'huge')
+SETUP_STATE = 'setup.pickle'
+
+
+def make_vocabulary(rng: random.Random) -> Tuple[List[bytes], List[float]]:
+    letters = 'etaoinshrdlucmfwypvbgkjqxz'
+    words = [''.join(rng.choice(letters[:rng.randint(6, 26)]) for _ in range(rng.randint(1, 10))).encode('ascii')
+             for _ in range(2000)]
+    return words, [1.0 / rank for rank in range(1, len(words) + 1)]
+
+
+def make_text(size: int, seed: int = SEED) -> bytes:
+    rng = random.Random(seed)
+    words, weights = make_vocabulary(rng)
+    parts = []
+    total = 0
+    while total < size:
+        line = b' '.join(rng.choices(words, weights, k=rng.randint(4, 16))) + b'\n'
+        parts.append(line)
+        total += len(line)
+    return b''.join(parts)[:size]
+
+
+def make_skewed(size: int, seed: int = SEED) -> bytes:
+    rng = random.Random(seed)
+    return bytes(min(int(rng.expovariate(0.35)), 255) for _ in range(size))
+
+
+def make_uniform(size: int, seed: int = SEED) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+def make_data(corpus: str, size: int) -> bytes:
+    return {'text': make_text, 'skewed': make_skewed, 'uniform': make_uniform}[corpus](size)
+
+
+def write_small_files(directory: str, count: int, seed: int = SEED) -> int:
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    total = 0
+    for index in range(count):
+        data = make_text(rng.randint(200, 4000), seed + index)
+        with open(os.path.join(directory, f"file{index:06d}.txt"), 'wb') as f:
+            f.write(data)
+        total += len(data)
+    return total
+
+
+def write_huge_file(path: str, size: int, seed: int = SEED) -> int:
+    chunk_size = 1 << 20
+    with open(path, 'wb') as f:
+        for index, offset in enumerate(range(0, size, chunk_size)):
+            f.write(make_text(min(chunk_size, size - offset), seed + index))
+    return size
+
+
+def prepare_files(corpus: str, sizes: Dict, workdir: str) -> Tuple[List[str], int]:
+    if corpus == 'small_files':
+        directory = os.path.join(workdir, 'small')
+        return [directory], write_small_files(directory, sizes['small_files'])
+    path = os.path.join(workdir, 'huge.txt')
+    return [path], write_huge_file(path, sizes['huge'])
+
+
+def measure(function: Callable, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def setup_data(corpus: str, sizes: Dict, workdir: str) -> Dict:
+    return {'data': make_data(corpus, sizes['data'])}
+
+
+def setup_frequencies(corpus: str, sizes: Dict, workdir: str) -> Dict:
+    return {'frequencies': ShannonFanoCompressor().calculate_frequencies(make_data(corpus, sizes['data']))}
+
+
+def setup_compressed(corpus: str, sizes: Dict, workdir: str) -> Dict:
+    data = make_data(corpus, sizes['data'])
+    compressed_data, codes, padding = ShannonFanoCompressor().compress_data(data)
+    return {'size': len(data), 'compressed_data': compressed_data, 'codes': codes, 'padding': padding}
+
+
+def setup_codes(corpus: str, sizes: Dict, workdir: str) -> Dict:
+    compressor = ShannonFanoCompressor()
+    return {'codes': compressor.build_codes(compressor.calculate_frequencies(make_data(corpus, sizes['data'])))}
+
+
+def setup_files(corpus: str, sizes: Dict, workdir: str) -> Dict:
+    paths, total = prepare_files(corpus, sizes, workdir)
+    return {'paths': paths, 'total': total}
+
+
+def setup_archive(corpus: str, sizes: Dict, workdir: str) -> Dict:
+    shared = corpus.endswith('_shared')
+    paths, total = prepare_files(corpus[:-len('_shared')] if shared else corpus, sizes, workdir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        FileArchiver(quiet=True).compress_files(paths, shared_table=shared)
+    archive = paths[0] + '.sf' if os.path.isfile(paths[0]) else 'archive.sf'
+    return {'archive': os.path.abspath(archive), 'total': total}
+
+
+def setup_directory(corpus: str, sizes: Dict, workdir: str) -> Dict:
+    archiver = FileArchiver()
+    out = io.BytesIO()
+    if corpus == 'json':
+        archiver._write_json_directory(out, synthetic_entries(sizes['entries']))
+    else:
+        archiver._write_directory(out, synthetic_entries(sizes['entries']))
+    return {'data': out.getvalue()[:-archiver.FOOTER_SIZE], 'count': sizes['entries'], 'json': corpus == 'json'}
+
+
+def bench_calculate_frequencies(state: Dict, sizes: Dict) -> Tuple[int, float]:
+    data = state['data']
+    compressor = ShannonFanoCompressor()
+    return len(data), measure(lambda: compressor.calculate_frequencies(data), sizes['repeat'])
+
+
+def bench_build_shannon_fano_tree(state: Dict, sizes: Dict) -> Tuple[int, float]:
+    compressor = ShannonFanoCompressor()
+    frequencies = state['frequencies']
+    return 0, measure(lambda: [compressor.build_shannon_fano_tree(frequencies) for _ in range(100)], sizes['repeat'])
+
+
+def bench_build_tree(state: Dict, sizes: Dict) -> Tuple[int, float]:
+    compressor = ShannonFanoCompressor()
+    frequencies = state['frequencies']
+    return 0, measure(lambda: [compressor.build_tree(frequencies).code_pairs() for _ in range(100)], sizes['repeat'])
+
+
+def bench_compress_data(state: Dict, sizes: Dict) -> Tuple[int, float]:
+    data = state['data']
+    compressor = ShannonFanoCompressor()
+    return len(data), measure(lambda: compressor.compress_data(data), sizes['repeat'])
+
+
+def bench_decompress_data(state: Dict, sizes: Dict) -> Tuple[int, float]:
+    decompressor = ShannonFanoDecompressor(quiet=True)
+    return state['size'], measure(lambda: decompressor.decompress_data(
+        state['compressed_data'], state['codes'], state['padding'], state['size']), sizes['repeat'])
+
+
+def bench_serialize_codes(state: Dict, sizes: Dict) -> Tuple[int, float]:
+    compressor = ShannonFanoCompressor()
+    decompressor = ShannonFanoDecompressor()
+    codes = state['codes']
+    serialized = compressor._serialize_codes(codes)
+
+    def run():
+        for _ in range(1000):
+            decompressor._deserialize_codes(compressor._serialize_codes(codes))
+    return len(serialized) * 1000, measure(run, sizes['repeat'])
+
+
+def bench_compress_files(state: Dict, sizes: Dict) -> Tuple[int, float]:
+    archiver = FileArchiver(quiet=True)
+    return state['total'], measure(lambda: archiver.compress_files(state['paths']), sizes['repeat'])
+
+
+def bench_decompress_file(state: Dict, sizes: Dict) -> Tuple[int, float]:
+    archiver = FileArchiver(quiet=True)
+    os.makedirs('out', exist_ok=True)
+    os.chdir('out')
+
+    def run():
+        DECODER_CACHE.clear()
+        archiver.decompress_file(state['archive'])
+    return state['total'], measure(run, sizes['repeat'])
+
+
+def bench_directory_listing(state: Dict, sizes: Dict) -> Tuple[int, float]:
+    archiver = FileArchiver()
+    data = state['data']
+    if state.get('json'):
+        return len(data), measure(lambda: archiver._read_headers(io.BytesIO(data), state['count']), sizes['repeat'])
+    return len(data), measure(lambda: archiver._read_directory(memoryview(data)), sizes['repeat'])
+
+
+BENCHMARKS = {
+    'calculate_frequencies': (setup_data, bench_calculate_frequencies, DATA_CORPORA),
+    'build_shannon_fano_tree': (setup_frequencies, bench_build_shannon_fano_tree, DATA_CORPORA),
+    'build_tree': (setup_frequencies, bench_build_tree, DATA_CORPORA),
+    'compress_data': (setup_data, bench_compress_data, DATA_CORPORA),
+    'decompress_data': (setup_compressed, bench_decompress_data, DATA_CORPORA),
+    'serialize_codes': (setup_codes, bench_serialize_codes, DATA_CORPORA),
+    'compress_files': (setup_files, bench_compress_files, FILE_CORPORA),
+    'decompress_file': (setup_archive, bench_decompress_file, FILE_CORPORA + ('small_files_shared',)),
+    'directory_listing': (setup_directory, bench_directory_listing, ('json', 'binary')),
+}
+
+
+def synthetic_entries(count: int) -> List[FileEntry]:
+    compressor = ShannonFanoCompressor(canonical=True)
+    tables = []
+    for variant in range(16):
+        text = (f"file {variant} " * (variant + 1) + "abcdefghij"[:variant % 10 + 1]).encode('utf-8')
+        tables.append(compressor.build_codes(compressor.calculate_frequencies(text)))
+    entries = []
+    offset = 0
+    for index in range(count):
+        size = 100 + index % 4000
+        compressed_size = size // 2
+        metadata = {'size': size, 'mtime': 1700000000.0 + index, 'atime': 1700000000.0 + index, 'mode': 0o100644}
+        entries.append(FileEntry(f"dir{index % 100}/file{index}.txt", size, compressed_size, metadata,
+                                 tables[index % len(tables)], index % 8, offset=offset))
+        offset += compressed_size
+    return entries
+
+
+def run_setup(name: str, corpus: str, mode: str, workdir: str):
+    setup, _, _ = BENCHMARKS[name]
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        state = setup(corpus, SIZES[mode], workdir)
+    finally:
+        os.chdir(cwd)
+    with open(os.path.join(workdir, SETUP_STATE), 'wb') as f:
+        pickle.dump(state, f)
+
+
+def run_case(name: str, corpus: str, mode: str, workdir: str) -> Dict:
+    _, function, _ = BENCHMARKS[name]
+    with open(os.path.join(workdir, SETUP_STATE), 'rb') as f:
+        state = pickle.load(f)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        size, seconds = function(state, SIZES[mode])
+    finally:
+        os.chdir(cwd)
+    return {
+        'name': name,
+        'corpus': corpus,
+        'bytes': size,
+        'seconds': round(seconds, 6),
+        'mb_per_s': round(size / seconds / 1e6, 3) if size and seconds else None,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(mode: str, only: Optional[List[str]] = None) -> Dict:
+    results = []
+    for name, (_, _, corpora) in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        for corpus in corpora:
+            with tempfile.TemporaryDirectory() as workdir:
+                arguments = [name, corpus, mode, workdir]
+                subprocess.run([sys.executable, os.path.abspath(__file__), '--setup'] + arguments,
+                               capture_output=True, check=True)
+                completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--case'] + arguments,
+                                           capture_output=True, text=True, check=True)
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{name} [{corpus}]: {result['seconds']:.3f} с, "
+                  f"{result['mb_per_s'] if result['mb_per_s'] is not None else '-'} МБ/с, "
+                  f"пик RSS {result['peak_rss_kb']} КБ", file=sys.stderr)
+    return {
+        'revision': git_revision(),
+        'mode': mode,
+        'python': platform.python_version(),
+        'numpy': numpy_backend.available(),
+        'results': results,
+    }
+
+
+def main(args: List[str]):
+    if args[:1] == ['--setup']:
+        run_setup(args[1], args[2], args[3], args[4])
+        return
+    if args[:1] == ['--case']:
+        print(json.dumps(run_case(args[1], args[2], args[3], args[4])))
+        return
+    mode = 'quick' if '--quick' in args else 'full'
+    output = args[args.index('--output') + 1] if '--output' in args else None
+    only = args[args.index('--only') + 1].split(',') if '--only' in args else None
+    report = json.dumps(run_suite(mode, only), indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
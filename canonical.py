@@ -0,0 +1,28 @@
+from typing import Dict
+
+WORD_BASE = 1 << 16
+
+
+def symbol_bytes(symbol: int) -> bytes:
+    if symbol >= WORD_BASE:
+        return (symbol - WORD_BASE).to_bytes(2, 'big')
+    return bytes((symbol,))
+
+
+def code_lengths(codes: Dict[int, str]) -> Dict[int, int]:
+    return {symbol: len(code) for symbol, code in codes.items()}
+
+
+def canonical_codes(lengths: Dict[int, int]) -> Dict[int, str]:
+    codes = {}
+    code = 0
+    previous_length = 0
+    for symbol, length in sorted(lengths.items(), key=lambda item: (item[1], item[0])):
+        if length == 0:
+            codes[symbol] = ''
+            continue
+        code <<= length - previous_length
+        previous_length = length
+        codes[symbol] = format(code, f'0{length}b')
+        code += 1
+    return codes
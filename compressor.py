@@ -1,46 +1,370 @@
-from collections import Counter
-from typing import Dict, List, Tuple
-from nodes import ShannonFanoNode
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from itertools import accumulate
+from math import log2
+import struct
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from nodes import ShannonFanoNode, ShannonFanoTree
+from canonical import WORD_BASE, canonical_codes, code_lengths
+from instrumentation import Instrumentation
+import numpy_backend
+
+class CodeTableCache:
+    KEY_LEVELS = 5
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.tables: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, frequencies: Dict[int, int]) -> Tuple:
+        total = sum(frequencies.values())
+        levels = ((symbol, (total // freq).bit_length()) for symbol, freq in frequencies.items() if freq)
+        return tuple(sorted(item for item in levels if item[1] <= self.KEY_LEVELS))
+
+    def get(self, key: Tuple) -> Optional[Dict[int, str]]:
+        codes = self.tables.get(key)
+        if codes is None:
+            self.misses += 1
+            return None
+        self.tables.move_to_end(key)
+        self.hits += 1
+        return codes
+
+    def put(self, key: Tuple, codes: Dict[int, str]):
+        self.tables[key] = codes
+        self.tables.move_to_end(key)
+        while len(self.tables) > self.capacity:
+            self.tables.popitem(last=False)
+
+
+class AdaptiveModel:
+    INTERVAL = 1 << 16
+    FIRST_INTERVAL = 1 << 12
+    DECAY_SHIFT = 1
+    HEADER = struct.Struct('>IB')
+    SEGMENT = struct.Struct('>BII')
+    RESET = 1
+
+    def __init__(self, interval: int = INTERVAL, decay_shift: int = DECAY_SHIFT):
+        if interval < 1:
+            raise ValueError(f"неверный интервал перестроения: {interval}")
+        self.interval = interval
+        self.decay_shift = decay_shift
+        self.builder = ShannonFanoCompressor(use_numpy=False)
+        self.prior_codes = canonical_codes(self.builder.build_code_lengths(dict.fromkeys(range(256), 1)))
+        self.reset()
+
+    def intervals(self) -> Iterator[int]:
+        size = min(self.FIRST_INTERVAL, self.interval)
+        while True:
+            yield size
+            size = min(size * 2, self.interval)
+
+    def reset(self):
+        self.counts = [1] * 256
+        self.codes = self.prior_codes
+
+    def update(self, frequencies: Dict[int, int]):
+        counts = [(count >> self.decay_shift) or 1 for count in self.counts]
+        for symbol, freq in frequencies.items():
+            counts[symbol] += freq
+        self.counts = counts
+        self.codes = canonical_codes(self.builder.build_code_lengths(dict(enumerate(counts))))
+
 
 class ShannonFanoCompressor:
-    def __init__(self):
+    PAIR_THRESHOLD = 1 << 16
+    NUMPY_THRESHOLD = 1 << 12
+    MAX_TABLE_SIZE = 0xFFFFFFFF
+
+    def __init__(self, use_numpy: Optional[bool] = None, canonical: bool = True, symbol_bits: int = 8,
+                 table_cache: Optional[CodeTableCache] = None, shared_codes: Optional[Dict[int, str]] = None,
+                 instrumentation: Optional[Instrumentation] = None):
+        if symbol_bits not in (8, 16):
+            raise ValueError(f"неподдерживаемый размер символа: {symbol_bits}")
         self.codes = {}
+        self.use_numpy = numpy_backend.available() if use_numpy is None else use_numpy
+        self.canonical = canonical
+        self.symbol_bits = symbol_bits
+        self.table_cache = table_cache
+        self.shared_codes = shared_codes
+        self.instrumentation = instrumentation or Instrumentation()
 
     def calculate_frequencies(self, data: bytes) -> Dict[int, int]:
-        return Counter(data)
-
-    def build_shannon_fano_tree(self, frequencies: Dict[int, int]) -> ShannonFanoNode:
-        nodes = [ShannonFanoNode(symbol, freq) for symbol, freq in frequencies.items()]
-        nodes.sort(key=lambda x: x.frequency, reverse=True)
-        def build_subtree(nodes_list: List[ShannonFanoNode]) -> ShannonFanoNode:
-            if len(nodes_list) == 1:
-                return nodes_list[0]
-            total_freq = sum(node.frequency for node in nodes_list)
-            current_freq = 0
-            split_index = 0
-            min_diff = float('inf')
-            for i in range(1, len(nodes_list)):
-                current_freq += nodes_list[i - 1].frequency
-                diff = abs(2 * current_freq - total_freq)
-                if diff < min_diff:
-                    min_diff = diff
-                    split_index = i
-            left_nodes = nodes_list[:split_index]
-            right_nodes = nodes_list[split_index:]
-            parent = ShannonFanoNode(frequency=total_freq)
-            parent.left = build_subtree(left_nodes)
-            parent.right = build_subtree(right_nodes)
-            return parent
-        return build_subtree(nodes)
-
-    def generate_codes(self, node: ShannonFanoNode, current_code: str = ""):
-        if node is None:
-            return
-        if node.symbol is not None:
-            self.codes[node.symbol] = current_code
+        with self.instrumentation.timer('count'):
+            if self.symbol_bits == 16:
+                return self._calculate_word_frequencies(data)
+            if self.use_numpy and len(data) >= self.NUMPY_THRESHOLD:
+                return numpy_backend.calculate_frequencies(data)
+            return Counter(data)
+
+    def _calculate_word_frequencies(self, data: bytes) -> Dict[int, int]:
+        even = len(data) & ~1
+        view = memoryview(data)
+        if self.use_numpy and len(data) >= self.NUMPY_THRESHOLD:
+            frequencies = numpy_backend.calculate_frequencies(view[:even], WORD_BASE)
+        else:
+            words = Counter(view[:even].cast('H'))
+            if sys.byteorder == 'little':
+                frequencies = Counter({WORD_BASE | ((word & 0xff) << 8) | (word >> 8): count
+                                       for word, count in words.items()})
+            else:
+                frequencies = Counter({WORD_BASE | word: count for word, count in words.items()})
+        if even < len(data):
+            frequencies[data[-1]] += 1
+        return frequencies
+
+    def decoded_size(self, frequencies: Dict[int, int]) -> int:
+        return sum(freq * (2 if symbol >= WORD_BASE else 1) for symbol, freq in frequencies.items())
+
+    def _sorted_prefix(self, frequencies: Dict[int, int]) -> Tuple[List[Tuple[int, int]], List[int]]:
+        items = sorted(frequencies.items(), key=lambda item: item[1], reverse=True)
+        prefix = [0]
+        prefix.extend(accumulate(freq for _, freq in items))
+        return items, prefix
+
+    def _split(self, prefix: List[int], start: int, end: int) -> int:
+        base = prefix[start]
+        total = prefix[end] - base
+        split = bisect_left(prefix, (base + prefix[end] + 1) // 2, start + 1, end - 1)
+        if split > start + 1:
+            lower = bisect_left(prefix, prefix[split - 1], start + 1, split - 1)
+            if abs(2 * (prefix[lower] - base) - total) <= abs(2 * (prefix[split] - base) - total):
+                split = lower
+        return split
+
+    def build_tree(self, frequencies: Dict[int, int]) -> ShannonFanoTree:
+        items, prefix = self._sorted_prefix(frequencies)
+        tree = ShannonFanoTree(2 * len(items) - 1 if items else 0)
+        if not items:
+            return tree
+        left, right, symbol, frequency = tree.left, tree.right, tree.symbol, tree.frequency
+        stack = [(0, len(items), tree.ROOT)]
+        next_index = tree.ROOT + 1
+        while stack:
+            start, end, index = stack.pop()
+            frequency[index] = prefix[end] - prefix[start]
+            if end - start == 1:
+                symbol[index] = items[start][0]
+                continue
+            split = self._split(prefix, start, end)
+            left[index] = next_index
+            right[index] = next_index + 1
+            stack.append((split, end, next_index + 1))
+            stack.append((start, split, next_index))
+            next_index += 2
+        return tree
+
+    def build_shannon_fano_tree(self, frequencies: Dict[int, int]) -> Optional[ShannonFanoNode]:
+        return self.build_tree(frequencies).node()
+
+    def build_code_lengths(self, frequencies: Dict[int, int]) -> Dict[int, int]:
+        items, prefix = self._sorted_prefix(frequencies)
+        if not items:
+            return {}
+        lengths = {}
+        stack = [(0, len(items), 0)]
+        while stack:
+            start, end, depth = stack.pop()
+            if end - start == 1:
+                lengths[items[start][0]] = depth
+                continue
+            split = self._split(prefix, start, end)
+            stack.append((split, end, depth + 1))
+            stack.append((start, split, depth + 1))
+        return lengths
+
+    def generate_codes(self, node: Optional[ShannonFanoNode], current_code: str = ""):
+        stack = [(node, current_code)]
+        while stack:
+            node, code = stack.pop()
+            if node is None:
+                continue
+            if node.symbol is not None:
+                self.codes[node.symbol] = code
+                continue
+            stack.append((node.right, code + "1"))
+            stack.append((node.left, code + "0"))
+
+    def _code_pairs(self, codes: Dict[int, str]) -> List[Tuple[int, int]]:
+        pairs = [(0, 0)] * (2 * WORD_BASE if self.symbol_bits == 16 else 256)
+        for symbol, code in codes.items():
+            pairs[symbol] = (int(code, 2) if code else 0, len(code))
+        return pairs
+
+    def _pair_codes(self, pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        if sys.byteorder == 'little':
+            return [((first << second_length) | second, first_length + second_length)
+                    for second, second_length in pairs for first, first_length in pairs]
+        return [((first << second_length) | second, first_length + second_length)
+                for first, first_length in pairs for second, second_length in pairs]
+
+    def _word_codes(self, pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        if sys.byteorder == 'little':
+            return [pairs[WORD_BASE | ((word & 0xff) << 8) | (word >> 8)] for word in range(WORD_BASE)]
+        return pairs[WORD_BASE:]
+
+    def _encode_into(self, data: bytes, pairs: List[Tuple[int, int]], out: bytearray,
+                     pos: int, acc: int, nbits: int) -> Tuple[int, int, int]:
+        if self.symbol_bits == 16:
+            even = len(data) & ~1
+            view = memoryview(data)
+            pos, acc, nbits = self._pack_bits(view[:even].cast('H'), self._word_codes(pairs), out, pos, acc, nbits)
+            return self._pack_bits(view[even:], pairs, out, pos, acc, nbits)
+        if self.use_numpy and len(data) >= self.NUMPY_THRESHOLD:
+            packed = numpy_backend.encode_into(data, pairs, out, pos, acc, nbits)
+            if packed is not None:
+                return packed
+        if len(data) < self.PAIR_THRESHOLD:
+            return self._pack_bits(data, pairs, out, pos, acc, nbits)
+        even = len(data) & ~1
+        view = memoryview(data)
+        pos, acc, nbits = self._pack_bits(view[:even].cast('H'), self._pair_codes(pairs), out, pos, acc, nbits)
+        return self._pack_bits(view[even:], pairs, out, pos, acc, nbits)
+
+    def _pack_bits(self, data: bytes, pairs: List[Tuple[int, int]], out: bytearray,
+                   pos: int, acc: int, nbits: int) -> Tuple[int, int, int]:
+        for symbol in data:
+            value, length = pairs[symbol]
+            acc = (acc << length) | value
+            nbits += length
+            if nbits >= 64:
+                nbits -= 64
+                out[pos:pos + 8] = (acc >> nbits).to_bytes(8, 'big')
+                acc &= (1 << nbits) - 1
+                pos += 8
+        return pos, acc, nbits
+
+    def _flush_bits(self, out: bytearray, pos: int, acc: int, nbits: int) -> Tuple[int, int]:
+        padding_bits = (8 - nbits % 8) % 8
+        byte_count = (nbits + padding_bits) // 8
+        out[pos:pos + byte_count] = (acc << padding_bits).to_bytes(byte_count, 'big')
+        return pos + byte_count, padding_bits
+
+    def build_shared_codes(self, frequencies: Dict[int, int]) -> Dict[int, str]:
+        smoothed = Counter(frequencies)
+        if self.symbol_bits == 8:
+            smoothed.update(range(256))
+        self.shared_codes = dict(self.build_codes(smoothed))
+        return self.shared_codes
+
+    def estimated_size(self, frequencies: Dict[int, int]) -> int:
+        total = sum(frequencies.values())
+        bits = sum(freq * log2(total / freq) for freq in frequencies.values() if freq)
+        table_size = min(3 + 2 * len(frequencies), 129) if self.symbol_bits == 8 else 5 + 5 * len(frequencies)
+        if table_size > self.MAX_TABLE_SIZE:
+            return sys.maxsize
+        return int(bits / 8) + table_size
+
+    def choose_codes(self, frequencies: Dict[int, int]) -> Dict[int, str]:
+        estimate = self.estimated_size(frequencies)
+        if self.shared_codes and self._fits(frequencies, self.shared_codes, estimate):
+            self.codes = self.shared_codes
+            return self.codes
+        if self.table_cache is None:
+            return self.build_codes(frequencies)
+        key = self.table_cache.key(frequencies)
+        cached = self.table_cache.get(key)
+        if cached is not None and self._fits(frequencies, cached, estimate):
+            self.codes = cached
+            return cached
+        codes = self.build_codes(frequencies)
+        self.table_cache.put(key, codes)
+        return codes
+
+    def _fits(self, frequencies: Dict[int, int], codes: Dict[int, str], estimate: int) -> bool:
+        return all(symbol in codes for symbol in frequencies) and self.encoded_size(frequencies, codes)[0] <= estimate
+
+    def build_codes(self, frequencies: Dict[int, int]) -> Dict[int, str]:
+        self.instrumentation.count('tables_built')
+        with self.instrumentation.timer('build'):
+            if self.canonical:
+                self.codes = canonical_codes(self.build_code_lengths(frequencies))
+                return self.codes
+            self.codes = self.build_tree(frequencies).codes()
+            return self.codes
+
+    def encoded_size(self, frequencies: Dict[int, int], codes: Dict[int, str]) -> Tuple[int, int]:
+        total_bits = sum(freq * len(codes[symbol]) for symbol, freq in frequencies.items())
+        return (total_bits + 7) // 8, (8 - total_bits % 8) % 8
+
+    def _aligned_chunks(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        if self.symbol_bits == 8:
+            yield from chunks
             return
-        self.generate_codes(node.left, current_code + "0")
-        self.generate_codes(node.right, current_code + "1")
+        carry = b''
+        for chunk in chunks:
+            if carry:
+                chunk = carry + bytes(chunk)
+            even = len(chunk) & ~1
+            carry = chunk[even:]
+            if even:
+                yield chunk[:even]
+        if carry:
+            yield carry
+
+    def calculate_stream_frequencies(self, chunks: Iterable[bytes]) -> Dict[int, int]:
+        frequencies = Counter()
+        for chunk in self._aligned_chunks(chunks):
+            frequencies.update(self.calculate_frequencies(chunk))
+        return frequencies
+
+    def compress_stream(self, chunks: Iterable[bytes], codes: Dict[int, str]) -> Iterator[bytes]:
+        pairs = self._code_pairs(codes)
+        max_length = max(length for _, length in pairs)
+        acc = 0
+        nbits = 0
+        for chunk in self._aligned_chunks(chunks):
+            with self.instrumentation.timer('encode'):
+                out = bytearray((nbits + len(chunk) * max_length) // 8 + 8)
+                pos, acc, nbits = self._encode_into(chunk, pairs, out, 0, acc, nbits)
+                whole = nbits // 8
+                nbits -= whole * 8
+                out[pos:pos + whole] = (acc >> nbits).to_bytes(whole, 'big')
+                acc &= (1 << nbits) - 1
+                del out[pos + whole:]
+            self.instrumentation.count('encode_bytes', len(chunk))
+            self.instrumentation.count('symbols', (len(chunk) + 1) // 2 if self.symbol_bits == 16 else len(chunk))
+            if out:
+                yield bytes(out)
+        if nbits:
+            yield bytes((acc << (8 - nbits),))
+
+    def _segments(self, chunks: Iterable[bytes], sizes: Iterator[int]) -> Iterator[bytes]:
+        carry = b''
+        size = next(sizes)
+        for chunk in chunks:
+            if carry:
+                chunk = carry + bytes(chunk)
+            view = memoryview(chunk)
+            start = 0
+            while len(view) - start >= size:
+                yield view[start:start + size]
+                start += size
+                size = next(sizes)
+            carry = bytes(view[start:])
+        if carry:
+            yield carry
+
+    def compress_adaptive(self, chunks: Iterable[bytes], interval: int = AdaptiveModel.INTERVAL,
+                          decay_shift: int = AdaptiveModel.DECAY_SHIFT) -> Iterator[bytes]:
+        if self.symbol_bits != 8:
+            raise ValueError("адаптивный режим поддерживает только 8-битные символы")
+        model = AdaptiveModel(interval, decay_shift)
+        yield model.HEADER.pack(interval, decay_shift)
+        for segment in self._segments(chunks, model.intervals()):
+            frequencies = self.calculate_frequencies(segment)
+            reset = self.encoded_size(frequencies, model.prior_codes)[0] < self.encoded_size(frequencies, model.codes)[0]
+            if reset:
+                model.reset()
+            compressed_data, padding_bits = self.encode_data(segment, frequencies, model.codes)
+            yield model.SEGMENT.pack(model.RESET * reset | padding_bits << 1, len(segment), len(compressed_data))
+            yield compressed_data
+            with self.instrumentation.timer('build'):
+                model.update(frequencies)
 
     def compress_data(self, data: bytes) -> Tuple[bytes, Dict[int, str], int]:
         if not data:
@@ -50,17 +374,26 @@ class ShannonFanoCompressor:
         if len(frequencies) == 0:
             print("Нет частот")
             return b'', {}, 0
-        root = self.build_shannon_fano_tree(frequencies)
-        self.codes = {}
-        self.generate_codes(root)
-        encoded_bits = ''.join(self.codes[byte] for byte in data)
-        padding_bits = (8 - len(encoded_bits) % 8) % 8
-        encoded_bits += '0' * padding_bits
-        compressed_bytes = bytearray()
-        for i in range(0, len(encoded_bits), 8):
-            byte_str = encoded_bits[i:i + 8]
-            compressed_bytes.append(int(byte_str, 2))
-        return bytes(compressed_bytes), self.codes, padding_bits
+        codes = self.choose_codes(frequencies)
+        compressed_data, padding_bits = self.encode_data(data, frequencies, codes)
+        return compressed_data, codes, padding_bits
+
+    def encode_data(self, data: bytes, frequencies: Dict[int, int], codes: Dict[int, str]) -> Tuple[bytes, int]:
+        with self.instrumentation.timer('encode'):
+            pairs = self._code_pairs({symbol: codes[symbol] for symbol in frequencies})
+            total_bits = sum(freq * pairs[symbol][1] for symbol, freq in frequencies.items())
+            compressed_bytes = bytearray((total_bits + 7) // 8)
+            pos, acc, nbits = self._encode_into(data, pairs, compressed_bytes, 0, 0, 0)
+            _, padding_bits = self._flush_bits(compressed_bytes, pos, acc, nbits)
+        self.instrumentation.count('encode_bytes', len(data))
+        self.instrumentation.count('symbols', sum(frequencies.values()))
+        return bytes(compressed_bytes), padding_bits
+
+    def worth_encoding(self, frequencies: Dict[int, int], codes: Dict[int, str]) -> bool:
+        table_size = 0 if codes is self.shared_codes else len(self._serialize_code_lengths(code_lengths(codes)))
+        if table_size > self.MAX_TABLE_SIZE:
+            return False
+        return self.encoded_size(frequencies, codes)[0] + table_size < self.decoded_size(frequencies)
 
     def _serialize_codes(self, codes: Dict[int, str]) -> bytes:
         result = bytearray()
@@ -74,10 +407,40 @@ class ShannonFanoCompressor:
         return bytes(result)
 
     def _bits_to_bytes(self, bits: str) -> bytes:
-        result = bytearray()
-        padded_length = (len(bits) + 7) // 8 * 8
-        padded_bits = bits.ljust(padded_length, '0')
-        for i in range(0, len(padded_bits), 8):
-            byte_str = padded_bits[i:i + 8]
-            result.append(int(byte_str, 2))
-        return bytes(result)
\ No newline at end of file
+        byte_count = (len(bits) + 7) // 8
+        if not byte_count:
+            return b''
+        return (int(bits, 2) << (byte_count * 8 - len(bits))).to_bytes(byte_count, 'big')
+
+    def _serialize_code_lengths(self, lengths: Dict[int, int]) -> bytes:
+        if lengths and (max(lengths) > 0xff or max(lengths.values()) > 0xff):
+            wide = bytearray((3,))
+            wide.extend(len(lengths).to_bytes(4, 'big'))
+            for symbol, length in sorted(lengths.items()):
+                wide.extend(symbol.to_bytes(3, 'big'))
+                wide.extend(length.to_bytes(2, 'big'))
+            return bytes(wide)
+        sparse = bytearray((1,))
+        sparse.extend(len(lengths).to_bytes(2, 'big'))
+        for symbol, length in sorted(lengths.items()):
+            sparse.append(symbol)
+            sparse.append(length)
+        if not lengths or min(lengths.values()) < 1:
+            return bytes(sparse)
+        vector = [lengths.get(symbol, 0) for symbol in range(256)]
+        runs = bytearray((2,))
+        start = 0
+        while start < 256:
+            end = start + 1
+            while end < 256 and vector[end] == vector[start]:
+                end += 1
+            runs.append(end - start - 1)
+            runs.append(vector[start])
+            start = end
+        candidates = [sparse, runs]
+        if max(vector) <= 15:
+            nibbles = bytearray(129)
+            for symbol in range(0, 256, 2):
+                nibbles[1 + symbol // 2] = (vector[symbol] << 4) | vector[symbol + 1]
+            candidates.append(nibbles)
+        return bytes(min(candidates, key=len))
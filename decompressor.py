@@ -1,9 +1,79 @@
-from typing import Dict, Tuple
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from canonical import canonical_codes, symbol_bytes
+from compressor import AdaptiveModel
+from instrumentation import Instrumentation
+import numpy_backend
+
+BYTE_BITS = tuple(f'{byte:08b}' for byte in range(256))
+
+
+class DecoderCache:
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.codes: OrderedDict = OrderedDict()
+        self.tables: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, codes: Dict[int, str]) -> Tuple:
+        return tuple(sorted(codes.items()))
+
+    def _get(self, cache: OrderedDict, key):
+        with self.lock:
+            value = cache.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            cache.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _put(self, cache: OrderedDict, key, value):
+        with self.lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.capacity:
+                cache.popitem(last=False)
+
+    def get_codes(self, data: bytes) -> Optional[Tuple[Dict[int, str], int]]:
+        return self._get(self.codes, data)
+
+    def put_codes(self, data: bytes, codes: Tuple[Dict[int, str], int]):
+        self._put(self.codes, data, codes)
+
+    def get_tables(self, key: Tuple, multi_symbol: bool) -> Optional[Tuple[List, List, int, int]]:
+        return self._get(self.tables, (key, multi_symbol))
+
+    def put_tables(self, key: Tuple, multi_symbol: bool, tables: Tuple[List, List, int, int]):
+        self._put(self.tables, (key, multi_symbol), tables)
+
+    def clear(self):
+        with self.lock:
+            self.codes.clear()
+            self.tables.clear()
+
+
+DECODER_CACHE = DecoderCache()
 
 
 class ShannonFanoDecompressor:
-    def __init__(self):
+    PRIMARY_BITS = 12
+    REFILL_BYTES = 16
+    OUTPUT_CHUNK = 1 << 20
+    NUMPY_THRESHOLD = 1 << 12
+    MULTI_THRESHOLD = 1 << 12
+
+    def __init__(self, use_numpy: bool = False, quiet: bool = False,
+                 instrumentation: Optional[Instrumentation] = None,
+                 decoder_cache: Optional[DecoderCache] = DECODER_CACHE):
         self.reverse_codes = {}
+        self.use_numpy = use_numpy and numpy_backend.available()
+        self.quiet = quiet
+        self.instrumentation = instrumentation or Instrumentation()
+        self.decoder_cache = decoder_cache
 
     def _deserialize_codes(self, data: bytes) -> Tuple[Dict[int, str], int]:
         codes = {}
@@ -30,28 +100,285 @@ class ShannonFanoDecompressor:
             codes[symbol] = code
         return codes, offset
 
+    def _deserialize_code_lengths(self, data: bytes) -> Tuple[Dict[int, int], int]:
+        lengths = {}
+        if not data:
+            return lengths, 0
+        if data[0] == 0:
+            for index in range(128):
+                packed = data[1 + index]
+                if packed >> 4:
+                    lengths[index * 2] = packed >> 4
+                if packed & 0x0f:
+                    lengths[index * 2 + 1] = packed & 0x0f
+            return lengths, 129
+        if data[0] == 2:
+            symbol = 0
+            offset = 1
+            while symbol < 256:
+                run = data[offset] + 1
+                length = data[offset + 1]
+                if length:
+                    for index in range(symbol, symbol + run):
+                        lengths[index] = length
+                symbol += run
+                offset += 2
+            return lengths, offset
+        if data[0] == 3:
+            count = int.from_bytes(data[1:5], 'big')
+            offset = 5
+            for _ in range(count):
+                lengths[int.from_bytes(data[offset:offset + 3], 'big')] = int.from_bytes(data[offset + 3:offset + 5], 'big')
+                offset += 5
+            return lengths, offset
+        count = int.from_bytes(data[1:3], 'big')
+        offset = 3
+        for _ in range(count):
+            lengths[data[offset]] = data[offset + 1]
+            offset += 2
+        return lengths, offset
+
+    def _deserialize_canonical_codes(self, data: bytes) -> Tuple[Dict[int, str], int]:
+        if self.decoder_cache is None:
+            lengths, offset = self._deserialize_code_lengths(data)
+            return canonical_codes(lengths), offset
+        data = bytes(data)
+        cached = self.decoder_cache.get_codes(data)
+        if cached is None:
+            lengths, offset = self._deserialize_code_lengths(data)
+            cached = canonical_codes(lengths), offset
+            self.decoder_cache.put_codes(data, cached)
+        return cached
+
     def _bytes_to_bits(self, data: bytes, bit_length: int) -> str:
-        bits = ''.join(f'{byte:08b}' for byte in data)
-        return bits[:bit_length]
+        return ''.join([BYTE_BITS[byte] for byte in data])[:bit_length]
+
+    def _build_level(self, entries: List[Tuple[int, int, bytes]], consumed: int, width: int) -> List:
+        table: List = [None] * (1 << width)
+        long_groups: Dict[int, List[Tuple[int, int, bytes]]] = {}
+        for value, length, output in entries:
+            remaining = length - consumed
+            rest = value & ((1 << remaining) - 1)
+            if remaining <= width:
+                start = rest << (width - remaining)
+                span = 1 << (width - remaining)
+                table[start:start + span] = [(output, length)] * span
+            else:
+                long_groups.setdefault(rest >> (remaining - width), []).append((value, length, output))
+        for prefix, group in long_groups.items():
+            sub_width = min(self.PRIMARY_BITS, max(length for _, length, _ in group) - consumed - width)
+            table[prefix] = (None, (self._build_level(group, consumed + width, sub_width), sub_width))
+        return table
+
+    def _decode_tables(self, codes: Dict[int, str], multi_symbol: bool) -> Optional[Tuple[List, List, int, int]]:
+        with self.instrumentation.timer('decode_tables'):
+            if self.decoder_cache is None:
+                return self._build_decode_tables(codes, multi_symbol)
+            key = self.decoder_cache.key(codes)
+            tables = self.decoder_cache.get_tables(key, multi_symbol)
+            if tables is None:
+                tables = self._build_decode_tables(codes, multi_symbol)
+                if tables is not None:
+                    self.decoder_cache.put_tables(key, multi_symbol, tables)
+            return tables
+
+    def _build_decode_tables(self, codes: Dict[int, str],
+                             multi_symbol: bool = True) -> Optional[Tuple[List, List, int, int]]:
+        entries = [(int(code, 2), len(code), symbol_bytes(symbol)) for symbol, code in codes.items() if code]
+        if not entries:
+            return None
+        max_length = max(length for _, length, _ in entries)
+        bits = min(self.PRIMARY_BITS, max_length)
+        single = self._build_level(entries, 0, bits)
+        if not multi_symbol:
+            return single, single, bits, max_length
+        mask = (1 << bits) - 1
+        multi = list(single)
+        for index in range(1 << bits):
+            parts = []
+            used = 0
+            while used < bits:
+                entry = single[(index << used) & mask]
+                if entry is None or entry[0] is None or entry[1] > bits - used:
+                    break
+                parts.append(entry[0])
+                used += entry[1]
+            if len(parts) > 1:
+                multi[index] = (b''.join(parts), used)
+        return multi, single, bits, max(bits, max_length)
+
+    def _next_window(self, chunks: Iterator[bytes], data: bytes, pos: int, size: int) -> Tuple[bytes, bool]:
+        parts = [data[pos:]] if pos < len(data) else []
+        available = len(data) - pos if pos < len(data) else 0
+        exhausted = True
+        for chunk in chunks:
+            parts.append(chunk)
+            available += len(chunk)
+            if available >= size:
+                exhausted = False
+                break
+        if len(parts) == 1:
+            return parts[0], exhausted
+        return b''.join(parts), exhausted
+
+    def _iter_decode(self, chunks: Iterator[bytes], tables: Tuple[List, List, int, int], total_bits: int,
+                     original_size: int, chunk_size: int) -> Iterator[bytes]:
+        multi, single, bits, need = tables
+        refill = max(need // 8 + 1, self.REFILL_BYTES)
+        mask = (1 << bits) - 1
+        result = bytearray()
+        remaining = original_size
+        acc = 0
+        nbits = 0
+        data = b''
+        exhausted = False
+        pos = 0
+        consumed = 0
+        table = multi
+        fast_limit = total_bits - need
+        while consumed < total_bits:
+            if nbits < need:
+                if len(result) >= chunk_size:
+                    del result[remaining:]
+                    remaining -= len(result)
+                    yield bytes(result)
+                    if remaining <= 0:
+                        return
+                    result = bytearray()
+                if pos + refill > len(data) and not exhausted:
+                    data, exhausted = self._next_window(chunks, data, pos, refill)
+                    pos = 0
+                chunk = data[pos:pos + refill]
+                acc &= (1 << nbits) - 1
+                acc = (acc << (refill * 8)) | int.from_bytes(chunk, 'big') << ((refill - len(chunk)) * 8)
+                nbits += refill * 8
+                pos += refill
+            if consumed > fast_limit:
+                table = single
+            entry = table[(acc >> (nbits - bits)) & mask]
+            if entry is None or entry[0] is None:
+                shift = nbits - bits
+                while entry is not None and entry[0] is None:
+                    sub_table, width = entry[1]
+                    shift -= width
+                    entry = sub_table[(acc >> shift) & ((1 << width) - 1)]
+                if entry is None:
+                    break
+            output, used = entry
+            if consumed + used > total_bits:
+                break
+            result += output
+            nbits -= used
+            consumed += used
+        del result[remaining:]
+        if result:
+            yield bytes(result)
+
+    def _single_symbol(self, codes: Dict[int, str]) -> Optional[bytes]:
+        if len(codes) == 1:
+            symbol, code = next(iter(codes.items()))
+            if not code:
+                return symbol_bytes(symbol)
+        return None
 
     def decompress_data(self, compressed_data: bytes, codes: Dict[int, str],
                         padding_bits: int, original_size: int) -> bytes:
+        return b''.join(self.iter_decompress_data(
+            compressed_data, codes, padding_bits, original_size, max(original_size, 1)))
+
+    def iter_decompress_data(self, compressed_data: bytes, codes: Dict[int, str], padding_bits: int,
+                             original_size: int, chunk_size: int = OUTPUT_CHUNK) -> Iterator[bytes]:
+        if not codes or (not compressed_data and self._single_symbol(codes) is None):
+            if not self.quiet:
+                print("Нет данных или кодов для распаковки")
+            return
+        if not self.quiet:
+            print(f"Было: {len(compressed_data)} байт")
+            print(f"Итоговый размер: {original_size} байт")
+        yield from self.instrumentation.timed(
+            self._iter_decompress(compressed_data, codes, padding_bits, original_size, chunk_size),
+            'decode', 'decode_bytes')
+
+    def _decompress(self, compressed_data: bytes, codes: Dict[int, str],
+                    padding_bits: int, original_size: int) -> bytes:
+        return b''.join(self._iter_decompress(
+            compressed_data, codes, padding_bits, original_size, max(original_size, 1)))
+
+    def _iter_decompress(self, compressed_data: bytes, codes: Dict[int, str], padding_bits: int,
+                         original_size: int, chunk_size: int) -> Iterator[bytes]:
+        single = self._single_symbol(codes)
+        if single is not None:
+            step = max(len(single), chunk_size - chunk_size % len(single))
+            for start in range(0, original_size, step):
+                count = min(step, original_size - start)
+                yield (single * -(-count // len(single)))[:count]
+            return
         if not compressed_data or not codes:
-            print("Нет данных или кодов для распаковки")
-            return b''
-        print(f"Было: {len(compressed_data)} байт")
-        print(f"Итоговый размер: {original_size} байт")
-        reverse_codes = {v: k for k, v in codes.items()}
-        bit_string = ''.join(f'{byte:08b}' for byte in compressed_data)
-        if padding_bits > 0:
-            bit_string = bit_string[:-padding_bits]
+            return
+        if self.use_numpy and len(compressed_data) >= self.NUMPY_THRESHOLD:
+            pairs = {symbol: (int(code, 2), len(code)) for symbol, code in codes.items() if code}
+            if pairs and max(pairs) <= 0xff and numpy_backend.can_decode(pairs):
+                yield from numpy_backend.iter_decode(compressed_data, pairs, padding_bits, original_size, chunk_size)
+                return
+        tables = self._decode_tables(codes, len(compressed_data) >= self.MULTI_THRESHOLD)
+        if tables is None:
+            return
+        yield from self._iter_decode(iter((compressed_data,)), tables, len(compressed_data) * 8 - padding_bits,
+                                     original_size, chunk_size)
+
+    def iter_decompress_stream(self, chunks: Iterable[bytes], compressed_size: int, codes: Dict[int, str],
+                               padding_bits: int, original_size: int,
+                               chunk_size: int = OUTPUT_CHUNK) -> Iterator[bytes]:
+        single = self._single_symbol(codes)
+        if single is not None or not compressed_size or not codes:
+            yield from self.instrumentation.timed(
+                self._iter_decompress(b'', codes, padding_bits, original_size, chunk_size), 'decode', 'decode_bytes')
+            return
+        tables = self._decode_tables(codes, compressed_size >= self.MULTI_THRESHOLD)
+        if tables is None:
+            return
+        yield from self.instrumentation.timed(
+            self._iter_decode(iter(chunks), tables, compressed_size * 8 - padding_bits, original_size, chunk_size),
+            'decode', 'decode_bytes')
+
+    def iter_decompress_adaptive(self, chunks: Iterable[bytes], original_size: int,
+                                 chunk_size: int = OUTPUT_CHUNK) -> Iterator[bytes]:
+        yield from self.instrumentation.timed(
+            self._iter_decompress_adaptive(iter(chunks), original_size, chunk_size), 'decode', 'decode_bytes')
+
+    def _iter_decompress_adaptive(self, chunks: Iterator[bytes], original_size: int,
+                                  chunk_size: int) -> Iterator[bytes]:
+        data = b''
+        pos = 0
+        exhausted = False
+
+        def take(size: int) -> bytes:
+            nonlocal data, pos, exhausted
+            if pos + size > len(data) and not exhausted:
+                data, exhausted = self._next_window(chunks, data, pos, size)
+                pos = 0
+            piece = data[pos:pos + size]
+            pos += size
+            if len(piece) < size:
+                raise ValueError("адаптивный поток обрезан")
+            return piece
+
+        interval, decay_shift = AdaptiveModel.HEADER.unpack(take(AdaptiveModel.HEADER.size))
+        model = AdaptiveModel(interval, decay_shift)
         result = bytearray()
-        current_bits = ''
-        for bit in bit_string:
-            current_bits += bit
-            if current_bits in reverse_codes:
-                result.append(reverse_codes[current_bits])
-                current_bits = ''
-                if len(result) == original_size:
-                    break
-        return bytes(result)
\ No newline at end of file
+        remaining = original_size
+        while remaining > 0:
+            flags, size, compressed_size = AdaptiveModel.SEGMENT.unpack(take(AdaptiveModel.SEGMENT.size))
+            if flags & AdaptiveModel.RESET:
+                model.reset()
+            decoded = self._decompress(take(compressed_size), model.codes, flags >> 1, size)
+            if len(decoded) != size or size > remaining:
+                raise ValueError("поврежден сегмент адаптивного потока")
+            model.update(Counter(decoded))
+            result += decoded
+            remaining -= size
+            if len(result) >= chunk_size:
+                yield bytes(result)
+                result = bytearray()
+        if result:
+            yield bytes(result)
@@ -0,0 +1,113 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+
+
+class StatsHook:
+    def on_stage(self, stage: str, seconds: float):
+        pass
+
+    def on_count(self, name: str, value: int):
+        pass
+
+
+class StatsCollector(StatsHook):
+    THROUGHPUT = {'encode': 'encode_bytes', 'decode': 'decode_bytes'}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stage_time: Dict[str, float] = {}
+        self.stage_calls: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+
+    def on_stage(self, stage: str, seconds: float):
+        with self.lock:
+            self.stage_time[stage] = self.stage_time.get(stage, 0.0) + seconds
+            self.stage_calls[stage] = self.stage_calls.get(stage, 0) + 1
+
+    def on_count(self, name: str, value: int):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict[str, Dict]:
+        return {
+            'stages': {stage: {'seconds': round(seconds, 6), 'calls': self.stage_calls[stage]}
+                       for stage, seconds in self.stage_time.items()},
+            'counters': dict(self.counters),
+            'throughput_mb_s': {stage: round(self.counters.get(counter, 0) / self.stage_time[stage] / 1e6, 3)
+                                for stage, counter in self.THROUGHPUT.items() if self.stage_time.get(stage)}
+        }
+
+
+class StageTimer:
+    __slots__ = ('instrumentation', 'stage', 'start')
+
+    def __init__(self, instrumentation: 'Instrumentation', stage: str):
+        self.instrumentation = instrumentation
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.instrumentation.add_time(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+NULL_TIMER = nullcontext()
+
+
+class Instrumentation:
+    def __init__(self, hooks: Iterable[StatsHook] = ()):
+        self.hooks: List[StatsHook] = list(hooks)
+        self.enabled = bool(self.hooks)
+
+    def add_hook(self, hook: StatsHook):
+        self.hooks.append(hook)
+        self.enabled = True
+
+    def timer(self, stage: str):
+        if not self.enabled:
+            return NULL_TIMER
+        return StageTimer(self, stage)
+
+    def add_time(self, stage: str, seconds: float):
+        for hook in self.hooks:
+            hook.on_stage(stage, seconds)
+
+    def count(self, name: str, value: int = 1):
+        if self.enabled:
+            for hook in self.hooks:
+                hook.on_count(name, value)
+
+    def timed(self, chunks: Iterator[bytes], stage: str, counter: str) -> Iterator[bytes]:
+        if not self.enabled:
+            yield from chunks
+            return
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            self.add_time(stage, time.perf_counter() - start)
+            if chunk is None:
+                return
+            self.count(counter, len(chunk))
+            yield chunk
+
+
+def profiled(function: Callable, *args, limit: int = 25, output: Optional[str] = None,
+             stream: Optional[TextIO] = None):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        if output:
+            profiler.dump_stats(output)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(limit)
+        print(report.getvalue(), file=stream)
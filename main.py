@@ -1,6 +1,55 @@
 import sys
 import os
+import json
+import shutil
+from contextlib import redirect_stdout
 from archiver import FileArchiver
+from access_control import AccessControl
+from instrumentation import Instrumentation, StatsCollector, profiled
+
+
+VALUE_OPTIONS = {'-p', '--chunk-size', '--jobs', '-j', '--block-size', '--symbol-bits', '--table-cache',
+                 '--stats', '--profile-output', '--kdf-iterations'}
+FLAG_OPTIONS = {'--stream', '--blocks', '--shared-table', '--pipeline', '-q', '--quiet', '--profile', '--adaptive'}
+
+
+def parse_options(args):
+    options = {}
+    positional = []
+    i = 0
+    while i < len(args):
+        name, separator, value = args[i].partition('=')
+        if separator and name in VALUE_OPTIONS:
+            options[name] = value
+            i += 1
+        elif args[i] in VALUE_OPTIONS and i + 1 < len(args):
+            options[args[i]] = args[i + 1]
+            i += 2
+        elif args[i] in FLAG_OPTIONS:
+            options[args[i]] = True
+            i += 1
+        else:
+            positional.append(args[i])
+            i += 1
+    return options, positional
+
+
+def parse_jobs(options):
+    return int(options.get('--jobs', options.get('-j', 1)))
+
+
+def parse_sizes(options):
+    chunk_size = None
+    if '--chunk-size' in options:
+        chunk_size = int(options['--chunk-size'])
+    elif options.get('--stream'):
+        chunk_size = FileArchiver.CHUNK_SIZE
+    block_size = None
+    if '--block-size' in options:
+        block_size = int(options['--block-size'])
+    elif options.get('--blocks'):
+        block_size = FileArchiver.BLOCK_SIZE
+    return chunk_size, block_size
 
 
 def main():
@@ -9,41 +58,122 @@ def main():
         print("Использовать следующим образом:")
         print("python main.py compress файл_1 файл_2 ... файл_n")
         print("python main.py compress dir")
+        print("cat log | python main.py compress - - сжать stdin за один проход (адаптивный режим, файл stdin в архиве)")
         print("python main.py decompress архив.sf")
+        print("python main.py decompress -j N архив.sf - распаковать файлы параллельно в N процессах")
+        print("python main.py extract архив.sf имя_файла - распаковать один файл")
+        print("python main.py update архив.sf файл_1 ... файл_n - дописать новые и измененные файлы")
+        print("python main.py list архив.sf - список файлов с размерами и степенью сжатия (читается только каталог)")
+        print("python main.py test [-j N] архив.sf - проверить контрольные суммы всех файлов без записи на диск")
+        print("python main.py cat архив.sf имя_файла - вывести файл из архива в stdout (потоково, память не растет)")
         print("Если сильно хочется, можно добавить:")
         print("  -p ваш_пароль")
+        print("  --kdf-iterations N - число итераций PBKDF2 для пароля (записывается в заголовок архива)")
+        print("  --stream - потоковое сжатие по частям, не держит файлы в памяти")
+        print("  --chunk-size N - размер части в байтах для --stream")
+        print("  --jobs N (-j N) - сжимать/распаковывать параллельно в N процессах")
+        print("  --blocks - разбить файлы на независимые блоки (записи SFv6 с флагом блоков)")
+        print("  --block-size N - размер блока в байтах для --blocks")
+        print("  -q, --quiet - не печатать строки по каждому файлу")
+        print("  --pipeline - конвейер: обход каталогов, чтение в потоках, сжатие и запись идут одновременно"
+              " (не сочетается с --stream и --blocks)")
+        print("  --shared-table - общая таблица кодов архива, обученная на начале файлов")
+        print("  --table-cache N - переиспользовать до N таблиц кодов для файлов с похожими частотами")
+        print("  --adaptive - адаптивные коды: таблица перестраивается по ходу сжатия, один проход чтения")
+        print("  --symbol-bits 16 - кодировать пары байтов как один символ (лучше для текстов и логов)")
+        print("  --stats=json - время стадий, счетчики и скорость кодирования/декодирования в JSON")
+        print("  --profile - запустить под cProfile и напечатать самые долгие функции")
+        print("  --profile-output файл - сохранить профиль cProfile в файл (для pstats/snakeviz)")
         return
-    archiver = FileArchiver()
     command = sys.argv[1]
+    options, args = parse_options(sys.argv[2:])
+    collector = None
+    instrumentation = None
+    if '--stats' in options:
+        if options['--stats'] != 'json':
+            print(f"Ошибка: неизвестный формат статистики {options['--stats']}, поддерживается json")
+            return
+        collector = StatsCollector()
+        instrumentation = Instrumentation([collector])
+    archiver = FileArchiver(int(options.get('--symbol-bits', 8)), int(options.get('--table-cache', 0)),
+                            bool(options.get('-q') or options.get('--quiet')), instrumentation,
+                            int(options.get('--kdf-iterations', AccessControl.ITERATIONS)))
+    report = sys.stderr if command == 'cat' else sys.stdout
+    if options.get('--profile') or '--profile-output' in options:
+        profiled(run_command, archiver, command, options, args, output=options.get('--profile-output'), stream=report)
+    else:
+        run_command(archiver, command, options, args)
+    if collector is not None:
+        print(json.dumps(collector.summary()), file=report)
+
+
+def run_command(archiver, command, options, args):
     if command == 'compress':
-        password = None
-        files = []
-        i = 2
-        while i < len(sys.argv):
-            if sys.argv[i] == '-p' and i + 1 < len(sys.argv):
-                password = sys.argv[i + 1]
-                i += 2
-            else:
-                files.append(sys.argv[i])
-                i += 1
+        password = options.get('-p')
+        files = args
         if not files:
             print("Ошибка: не указаны файлы для архивации")
             return
-        archiver.compress_files(files, password)
+        chunk_size, block_size = parse_sizes(options)
+        jobs = parse_jobs(options)
+        if options.get('--pipeline') and (chunk_size or block_size):
+            print("Ошибка: --pipeline нельзя сочетать с --stream/--chunk-size и --blocks/--block-size")
+            return
+        if (options.get('--adaptive') or '-' in files) and (
+                options.get('--pipeline') or options.get('--shared-table') or chunk_size or block_size
+                or jobs > 1 or archiver.compressor.symbol_bits != 8):
+            print("Ошибка: --adaptive и сжатие stdin нельзя сочетать с --pipeline, --shared-table, -j, "
+                  "--stream/--chunk-size, --blocks/--block-size и --symbol-bits 16")
+            return
+        archiver.compress_files(files, password, chunk_size, jobs, block_size,
+                                bool(options.get('--shared-table')), bool(options.get('--pipeline')),
+                                bool(options.get('--adaptive')))
     elif command == 'decompress':
-        if len(sys.argv) < 3:
+        if not args:
             print("Ошибка: укажите архив для распаковки")
             return
-        input_file = sys.argv[2]
-        password = None
-        if len(sys.argv) > 4 and sys.argv[3] == '-p':
-            password = sys.argv[4]
-        else:
+        input_file = args[0]
+        password = options.get('-p')
+        if password is None:
             print("Проверка архива...")
-        archiver.decompress_file(input_file, password)
+        archiver.decompress_file(input_file, password, parse_jobs(options))
+    elif command == 'extract':
+        if len(args) < 2:
+            print("Ошибка: укажите архив и имя файла")
+            return
+        archiver.extract(args[0], args[1], options.get('-p'))
+    elif command == 'list':
+        if not args:
+            print("Ошибка: укажите архив")
+            return
+        archiver.list_archive(args[0], options.get('-p'))
+    elif command == 'test':
+        if not args:
+            print("Ошибка: укажите архив для проверки")
+            return
+        if not archiver.test_archive(args[0], options.get('-p'), parse_jobs(options)):
+            sys.exit(1)
+    elif command == 'cat':
+        if len(args) < 2:
+            print("Ошибка: укажите архив и имя файла", file=sys.stderr)
+            return
+        try:
+            with redirect_stdout(sys.stderr):
+                member = archiver.open(args[0], args[1], options.get('-p'))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ошибка: {e}", file=sys.stderr)
+            return
+        with member:
+            shutil.copyfileobj(member, sys.stdout.buffer, FileArchiver.CHUNK_SIZE)
+    elif command == 'update':
+        if len(args) < 2:
+            print("Ошибка: укажите архив и файлы для обновления")
+            return
+        chunk_size, block_size = parse_sizes(options)
+        archiver.update(args[0], args[1:], options.get('-p'), chunk_size, parse_jobs(options), block_size)
     else:
-        print("Неизвестная команда. Используйте 'compress' или 'decompress'")
+        print("Неизвестная команда. Используйте 'compress', 'decompress', 'extract', 'list', 'test', 'cat' или 'update'")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,6 +1,9 @@
-from typing import Optional
+from array import array
+from typing import Dict, Optional, Tuple
 
 class ShannonFanoNode:
+    __slots__ = ('symbol', 'frequency', 'left', 'right')
+
     def __init__(self, symbol: Optional[int] = None, frequency: int = 0):
         self.symbol = symbol
         self.frequency = frequency
@@ -10,4 +13,57 @@ class ShannonFanoNode:
     def __repr__(self):
         if self.symbol is not None:
             return f"Node(symbol={chr(self.symbol) if 32 <= self.symbol <= 126 else self.symbol}, freq={self.frequency})"
-        return f"Node(internal, freq={self.frequency})"
\ No newline at end of file
+        return f"Node(internal, freq={self.frequency})"
+
+
+class ShannonFanoTree:
+    __slots__ = ('left', 'right', 'symbol', 'frequency')
+    ROOT = 0
+
+    def __init__(self, size: int = 0):
+        self.left = array('i', [-1]) * size
+        self.right = array('i', [-1]) * size
+        self.symbol = array('i', [-1]) * size
+        self.frequency = array('q', [0]) * size
+
+    def __len__(self):
+        return len(self.symbol)
+
+    def code_pairs(self) -> Dict[int, Tuple[int, int]]:
+        pairs = {}
+        if not len(self):
+            return pairs
+        left, right, symbol = self.left, self.right, self.symbol
+        stack = [(self.ROOT, 0, 0)]
+        while stack:
+            index, code, length = stack.pop()
+            if symbol[index] >= 0:
+                pairs[symbol[index]] = (code, length)
+                continue
+            stack.append((right[index], (code << 1) | 1, length + 1))
+            stack.append((left[index], code << 1, length + 1))
+        return pairs
+
+    def codes(self) -> Dict[int, str]:
+        return {symbol: bin(code)[2:].zfill(length) if length else ""
+                for symbol, (code, length) in self.code_pairs().items()}
+
+    def node(self, index: int = ROOT) -> Optional[ShannonFanoNode]:
+        if not len(self):
+            return None
+        nodes = {}
+        stack = [index]
+        while stack:
+            current = stack.pop()
+            if current not in nodes:
+                symbol = self.symbol[current]
+                nodes[current] = ShannonFanoNode(symbol if symbol >= 0 else None, self.frequency[current])
+                if symbol < 0:
+                    stack.extend((current, self.right[current], self.left[current]))
+                continue
+            nodes[current].left = nodes[self.left[current]]
+            nodes[current].right = nodes[self.right[current]]
+        return nodes[index]
+
+    def __repr__(self):
+        return f"ShannonFanoTree(nodes={len(self)})"
@@ -0,0 +1,130 @@
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FREQUENCY_BLOCK = 1 << 20
+ENCODE_BLOCK = 1 << 18
+DECODE_BLOCK = 1 << 16
+MAX_ENCODE_LENGTH = 64
+MAX_DECODE_LENGTH = 20
+MIN_DECODE_LENGTH = 5
+
+
+def available() -> bool:
+    return np is not None
+
+
+def calculate_frequencies(data: bytes, base: int = 0) -> Dict[int, int]:
+    symbols = np.frombuffer(data, dtype='>u2' if base else np.uint8)
+    alphabet = 1 << 16 if base else 256
+    counts = np.zeros(alphabet, dtype=np.int64)
+    first_seen = np.full(alphabet, len(symbols), dtype=np.int64)
+    for start in range(0, len(symbols), FREQUENCY_BLOCK):
+        block = symbols[start:start + FREQUENCY_BLOCK]
+        block_counts = np.bincount(block, minlength=alphabet)
+        if np.any((block_counts > 0) & (counts == 0)):
+            values, index = np.unique(block, return_index=True)
+            new = counts[values] == 0
+            first_seen[values[new]] = start + index[new]
+        counts += block_counts
+    present = np.flatnonzero(counts)
+    order = present[np.argsort(first_seen[present], kind='stable')]
+    return Counter({base | int(symbol): int(counts[symbol]) for symbol in order})
+
+
+def encode_into(data: bytes, pairs: List[Tuple[int, int]], out: bytearray,
+                pos: int, acc: int, nbits: int) -> Optional[Tuple[int, int, int]]:
+    lengths = np.array([length for _, length in pairs], dtype=np.int64)
+    max_length = int(lengths.max())
+    if max_length > MAX_ENCODE_LENGTH:
+        return None
+    values = np.array([value for value, _ in pairs], dtype=np.uint64)
+    symbols = np.frombuffer(data, dtype=np.uint8)
+    carry = np.array([(acc >> (nbits - 1 - i)) & 1 for i in range(nbits)], dtype=np.uint8)
+    for start in range(0, len(symbols), ENCODE_BLOCK):
+        block = symbols[start:start + ENCODE_BLOCK]
+        block_lengths = lengths[block]
+        block_values = values[block]
+        ends = np.cumsum(block_lengths) + len(carry)
+        starts = ends - block_lengths
+        bits = np.zeros(int(ends[-1]) if len(ends) else len(carry), dtype=np.uint8)
+        bits[:len(carry)] = carry
+        for bit in range(max_length):
+            selected = block_lengths > bit
+            shifts = (block_lengths[selected] - 1 - bit).astype(np.uint64)
+            bits[starts[selected] + bit] = (block_values[selected] >> shifts) & np.uint64(1)
+        whole = len(bits) // 8 * 8
+        packed = np.packbits(bits[:whole])
+        out[pos:pos + len(packed)] = packed.tobytes()
+        pos += len(packed)
+        carry = bits[whole:]
+    acc = 0
+    for bit in carry:
+        acc = (acc << 1) | int(bit)
+    return pos, acc, len(carry)
+
+
+def can_decode(pairs: Dict[int, Tuple[int, int]]) -> bool:
+    lengths = [length for _, length in pairs.values()]
+    max_length = max(lengths)
+    if max_length > MAX_DECODE_LENGTH or min(lengths) < MIN_DECODE_LENGTH:
+        return False
+    return sum(1 << (max_length - length) for length in lengths) == 1 << max_length
+
+
+def iter_decode(data: bytes, pairs: Dict[int, Tuple[int, int]], padding_bits: int,
+                original_size: int, chunk_size: int) -> Iterator[bytes]:
+    max_length = max(length for _, length in pairs.values())
+    lut_symbols = np.zeros(1 << max_length, dtype=np.uint8)
+    lut_lengths = np.zeros(1 << max_length, dtype=np.int32)
+    for symbol, (value, length) in pairs.items():
+        start = value << (max_length - length)
+        stop = start + (1 << (max_length - length))
+        lut_symbols[start:stop] = symbol
+        lut_lengths[start:stop] = length
+    total_bits = len(data) * 8 - padding_bits
+    result = bytearray()
+    remaining = original_size
+    position = 0
+    while position < total_bits and remaining > 0:
+        end = min(position + DECODE_BLOCK, total_bits)
+        size = end - position
+        first_byte = position // 8
+        shift = position - first_byte * 8
+        bits = np.unpackbits(np.frombuffer(data[first_byte:(end + max_length + 7) // 8], dtype=np.uint8))
+        bits = np.concatenate([bits, np.zeros(max(0, shift + size + max_length - len(bits)), dtype=np.uint8)])
+        windows = np.zeros(size, dtype=np.int32)
+        for bit in range(max_length):
+            windows = (windows << 1) | bits[shift + bit:shift + bit + size]
+        lengths = lut_lengths[windows]
+        jumps = np.append(np.minimum(np.arange(size, dtype=np.int32) + lengths, size), np.int32(size))
+        visited = np.zeros(size + 1, dtype=bool)
+        visited[0] = True
+        reached = np.zeros(1, dtype=np.int32)
+        while True:
+            targets = jumps[reached]
+            targets = targets[~visited[targets]]
+            if not targets.size:
+                break
+            visited[targets] = True
+            reached = np.concatenate([reached, targets])
+            jumps = jumps[jumps]
+        starts = np.flatnonzero(visited[:size])
+        if position + int(starts[-1]) + int(lengths[starts[-1]]) > total_bits:
+            starts = starts[:-1]
+            if not starts.size:
+                break
+        result += lut_symbols[windows[starts]].tobytes()
+        position += int(starts[-1]) + int(lengths[starts[-1]])
+        if len(result) >= chunk_size:
+            del result[remaining:]
+            remaining -= len(result)
+            yield bytes(result)
+            result = bytearray()
+    del result[remaining:]
+    if result:
+        yield bytes(result)
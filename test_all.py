@@ -3,11 +3,13 @@ import tempfile
 import unittest
 from collections import Counter
 
-from archiver import FileArchiver, FileEntry
-from compressor import ShannonFanoCompressor
-from decompressor import ShannonFanoDecompressor
-from access_control import AccessControl
-from nodes import ShannonFanoNode
+from archiver import FileArchiver, FileEntry, PipelineStats
+from compressor import AdaptiveModel, CodeTableCache, ShannonFanoCompressor
+from decompressor import BYTE_BITS, DecoderCache, ShannonFanoDecompressor
+from access_control import AccessControl, KeyCache
+from instrumentation import Instrumentation, StatsCollector, profiled
+from nodes import ShannonFanoNode, ShannonFanoTree
+import numpy_backend
 
 
 class TestNodes(unittest.TestCase):
@@ -75,6 +77,21 @@ class TestCompressor(unittest.TestCase):
         for code in self.compressor.codes.values():
             self.assertTrue(all(bit in '01' for bit in code))
 
+    def test_build_tree_arrays(self):
+        frequencies = self.compressor.calculate_frequencies(b"abracadabra, simsalabim")
+        tree = self.compressor.build_tree(frequencies)
+        self.assertIsInstance(tree, ShannonFanoTree)
+        self.assertEqual(len(tree), 2 * len(frequencies) - 1)
+        self.assertEqual(tree.frequency[tree.ROOT], sum(frequencies.values()))
+        self.compressor.codes = {}
+        self.compressor.generate_codes(tree.node())
+        self.assertEqual(tree.codes(), self.compressor.codes)
+        self.assertEqual({symbol: length for symbol, (_, length) in tree.code_pairs().items()},
+                         self.compressor.build_code_lengths(frequencies))
+        self.assertEqual(ShannonFanoCompressor(canonical=False).build_codes(frequencies), tree.codes())
+        self.assertEqual(self.compressor.build_tree({7: 5}).codes(), {7: ''})
+        self.assertEqual(len(self.compressor.build_tree({})), 0)
+
     def test_compress_data(self):
         test_data = b"TEST DATA"
         compressed_data, codes, padding = self.compressor.compress_data(test_data)
@@ -84,6 +101,13 @@ class TestCompressor(unittest.TestCase):
         self.assertGreaterEqual(padding, 0)
         self.assertLessEqual(padding, 7)
 
+    def test_compress_data_matches_bit_string(self):
+        test_data = bytes((i * 7) % 13 for i in range(self.compressor.PAIR_THRESHOLD + 3))
+        compressed_data, codes, padding = self.compressor.compress_data(test_data)
+        bits = ''.join(codes[byte] for byte in test_data) + '0' * padding
+        expected = bytes(int(bits[i:i + 8], 2) for i in range(0, len(bits), 8))
+        self.assertEqual(compressed_data, expected)
+
     def test_compress_empty_data(self):
         compressed_data, codes, padding = self.compressor.compress_data(b"")
         self.assertEqual(compressed_data, b"")
@@ -98,6 +122,91 @@ class TestCompressor(unittest.TestCase):
         deserialized_codes, _ = decompressor._deserialize_codes(serialized)
         self.assertEqual(deserialized_codes, test_codes)
 
+    def test_serialize_code_lengths(self):
+        decompressor = ShannonFanoDecompressor()
+        sparse = {65: 1, 66: 2, 67: 2}
+        serialized = self.compressor._serialize_code_lengths(sparse)
+        self.assertEqual(decompressor._deserialize_code_lengths(serialized), (sparse, len(serialized)))
+        dense = {symbol: 8 for symbol in range(256)}
+        serialized = self.compressor._serialize_code_lengths(dense)
+        self.assertEqual(serialized, bytes((2, 255, 8)))
+        self.assertEqual(decompressor._deserialize_code_lengths(serialized), (dense, 3))
+        mixed = {symbol: 4 + symbol % 3 for symbol in range(64)}
+        serialized = self.compressor._serialize_code_lengths(mixed)
+        self.assertEqual(len(serialized), 129)
+        self.assertEqual(decompressor._deserialize_code_lengths(serialized), (mixed, 129))
+
+    def test_build_code_lengths_matches_tree(self):
+        frequencies = {symbol: (symbol * 7919) % 101 + 1 for symbol in range(300)}
+        frequencies.update({1000: 5, 1001: 5, 1002: 0})
+        self.compressor.codes = {}
+        self.compressor.generate_codes(self.compressor.build_shannon_fano_tree(frequencies))
+        expected = {symbol: len(code) for symbol, code in self.compressor.codes.items()}
+        self.assertEqual(self.compressor.build_code_lengths(frequencies), expected)
+        self.assertEqual(self.compressor.build_code_lengths({65: 4}), {65: 0})
+
+    def test_compress_adaptive(self):
+        import random
+        rng = random.Random(7)
+        text = b"INFO request ok\nWARN retry\n" * 200
+        noise = bytes(rng.randrange(256) for _ in range(5000))
+        decompressor = ShannonFanoDecompressor()
+        for data in [b"", b"a", text + noise + text]:
+            chunks = [data[i:i + 700] for i in range(0, len(data), 700)]
+            compressed = b''.join(self.compressor.compress_adaptive(chunks, 1024))
+            for size in [1, 100, len(compressed)]:
+                parts = [compressed[i:i + size] for i in range(0, len(compressed), size)]
+                self.assertEqual(b''.join(decompressor.iter_decompress_adaptive(parts, len(data), 999)), data)
+        self.assertLess(len(compressed), len(data))
+        flags = []
+        offset = AdaptiveModel.HEADER.size
+        while offset < len(compressed):
+            flag, _, compressed_size = AdaptiveModel.SEGMENT.unpack_from(compressed, offset)
+            flags.append(flag & AdaptiveModel.RESET)
+            offset += AdaptiveModel.SEGMENT.size + compressed_size
+        self.assertIn(1, flags)
+        with self.assertRaises(ValueError):
+            list(decompressor.iter_decompress_adaptive([compressed[:-10]], len(data)))
+
+    def test_compress_word_symbols(self):
+        compressor = ShannonFanoCompressor(symbol_bits=16, use_numpy=False)
+        decompressor = ShannonFanoDecompressor(use_numpy=False)
+        for data in [b"INFO request ok\nINFO request ok\nWARN retry\n", b"abab", b"abcde"]:
+            compressed_data, codes, padding = compressor.compress_data(data)
+            self.assertEqual(decompressor._decompress(compressed_data, codes, padding, len(data)), data)
+            serialized = compressor._serialize_code_lengths({symbol: len(code) for symbol, code in codes.items()})
+            self.assertEqual(decompressor._deserialize_canonical_codes(serialized)[0], codes)
+            chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+            self.assertEqual(compressor.calculate_stream_frequencies(chunks), compressor.calculate_frequencies(data))
+            self.assertEqual(b''.join(compressor.compress_stream(chunks, codes)), compressed_data)
+        self.assertIn(ord('e'), codes)
+        self.assertIn(0x10000 | 0x6162, codes)
+
+    def test_choose_codes_shared_and_cached(self):
+        sample = b"status ok user alpha beta gamma delta error time id " * 20
+        self.compressor.build_shared_codes(self.compressor.calculate_frequencies(sample))
+        frequencies = self.compressor.calculate_frequencies(b"user beta status ok time")
+        self.assertIs(self.compressor.choose_codes(frequencies), self.compressor.shared_codes)
+        skewed = self.compressor.calculate_frequencies(b"\x00" * 5000 + b"\x01")
+        self.assertIsNot(self.compressor.choose_codes(skewed), self.compressor.shared_codes)
+        self.compressor.shared_codes = None
+        self.compressor.table_cache = CodeTableCache(1)
+        collector = StatsCollector()
+        self.compressor.instrumentation = Instrumentation([collector])
+        first = self.compressor.choose_codes(frequencies)
+        self.assertIs(self.compressor.choose_codes(frequencies), first)
+        self.assertEqual(collector.counters['tables_built'], 1)
+        self.compressor.choose_codes(skewed)
+        self.assertEqual((self.compressor.table_cache.hits, len(self.compressor.table_cache.tables)), (1, 1))
+        self.assertEqual(collector.counters['tables_built'], 2)
+
+    def test_build_codes_canonical(self):
+        codes = self.compressor.build_codes(self.compressor.calculate_frequencies(b"abracadabra alakazam"))
+        ordered = sorted(codes.items(), key=lambda item: (len(item[1]), item[0]))
+        values = [code.ljust(max(len(c) for c in codes.values()), '0') for _, code in ordered]
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(ordered[0][1], '0' * len(ordered[0][1]))
+
 
 class TestDecompressor(unittest.TestCase):
     def setUp(self):
@@ -116,6 +225,24 @@ class TestDecompressor(unittest.TestCase):
         self.assertEqual(bits, '1111')
         bits = self.decompressor._bytes_to_bits(test_bytes, 6)
         self.assertEqual(bits, '111100')
+        self.assertEqual(BYTE_BITS[5], '00000101')
+
+    def test_decoder_cache(self):
+        cache = DecoderCache(capacity=2)
+        decompressor = ShannonFanoDecompressor(use_numpy=False, decoder_cache=cache)
+        compressor = ShannonFanoCompressor()
+        data = b"cached decoder tables " * 50
+        compressed_data, codes, padding = compressor.compress_data(data)
+        serialized = compressor._serialize_code_lengths({symbol: len(code) for symbol, code in codes.items()})
+        first = decompressor._deserialize_canonical_codes(serialized)
+        self.assertIs(decompressor._deserialize_canonical_codes(memoryview(serialized))[0], first[0])
+        for _ in range(3):
+            self.assertEqual(decompressor.decompress_data(compressed_data, dict(codes), padding, len(data)), data)
+        self.assertEqual((cache.hits, cache.misses), (3, 2))
+        self.assertEqual(len(cache.tables), 1)
+        for symbol in range(3):
+            decompressor._decode_tables({symbol: '0', 255: '1'}, False)
+        self.assertEqual(len(cache.tables), 2)
 
     def test_decompress_simple_data(self):
         compressed_data = b'\x58'
@@ -127,11 +254,77 @@ class TestDecompressor(unittest.TestCase):
         )
         self.assertEqual(result, b'ABCA')
 
+    def test_decompress_long_codes(self):
+        fib = [1, 1]
+        while len(fib) < 20:
+            fib.append(fib[-1] + fib[-2])
+        test_data = b''.join(bytes([65 + i]) * freq for i, freq in enumerate(fib))
+        compressed_data, codes, padding = ShannonFanoCompressor().compress_data(test_data)
+        self.assertGreater(max(len(code) for code in codes.values()), self.decompressor.PRIMARY_BITS)
+        result = self.decompressor.decompress_data(compressed_data, codes, padding, len(test_data))
+        self.assertEqual(result, test_data)
+
+    def test_iter_decompress_data_chunks(self):
+        test_data = bytes((i * 31) % 7 for i in range(5000))
+        compressed_data, codes, padding = ShannonFanoCompressor().compress_data(test_data)
+        chunks = list(self.decompressor.iter_decompress_data(
+            memoryview(compressed_data), codes, padding, len(test_data), 1000))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b''.join(chunks), test_data)
+
+    def test_decompress_single_symbol(self):
+        compressed_data, codes, padding = ShannonFanoCompressor().compress_data(b"zzzz")
+        result = self.decompressor.decompress_data(compressed_data, codes, padding, 4)
+        self.assertEqual(result, b"zzzz")
+
     def test_decompress_empty_data(self):
         result = self.decompressor.decompress_data(b"", {}, 0, 0)
         self.assertEqual(result, b"")
 
 
+@unittest.skipUnless(numpy_backend.available(), "NumPy не установлен")
+class TestNumpyBackend(unittest.TestCase):
+    def setUp(self):
+        self.samples = [
+            bytes((i * i + i // 3) % 11 for i in range(50000)),
+            bytes((i * 2654435761 >> 7) & 0xff for i in range(30001)),
+        ]
+
+    def test_frequencies_parity(self):
+        for data in self.samples:
+            expected = ShannonFanoCompressor(use_numpy=False).calculate_frequencies(data)
+            result = ShannonFanoCompressor(use_numpy=True).calculate_frequencies(data)
+            self.assertEqual(list(result.items()), list(expected.items()))
+
+    def test_frequencies_parity_blocks(self):
+        block = numpy_backend.FREQUENCY_BLOCK
+        numpy_backend.FREQUENCY_BLOCK = 1000
+        try:
+            for symbol_bits in (8, 16):
+                for data in self.samples:
+                    expected = ShannonFanoCompressor(use_numpy=False, symbol_bits=symbol_bits).calculate_frequencies(data)
+                    result = ShannonFanoCompressor(use_numpy=True, symbol_bits=symbol_bits).calculate_frequencies(data)
+                    self.assertEqual(list(result.items()), list(expected.items()))
+        finally:
+            numpy_backend.FREQUENCY_BLOCK = block
+
+    def test_compress_parity(self):
+        for data in self.samples:
+            expected = ShannonFanoCompressor(use_numpy=False).compress_data(data)
+            result = ShannonFanoCompressor(use_numpy=True).compress_data(data)
+            self.assertEqual(result, expected)
+
+    def test_decompress_parity(self):
+        for data in self.samples:
+            compressed_data, codes, padding = ShannonFanoCompressor().compress_data(data)
+            expected = ShannonFanoDecompressor(use_numpy=False).decompress_data(
+                compressed_data, codes, padding, len(data))
+            result = ShannonFanoDecompressor(use_numpy=True).decompress_data(
+                compressed_data, codes, padding, len(data))
+            self.assertEqual(result, expected)
+            self.assertEqual(result, data)
+
+
 class TestAccessControl(unittest.TestCase):
     def setUp(self):
         self.access_control = AccessControl()
@@ -163,6 +356,23 @@ class TestAccessControl(unittest.TestCase):
         result = self.access_control.is_protected(password_hash)
         self.assertTrue(result)
 
+    def test_key_cache(self):
+        cache = KeyCache(capacity=2)
+        access_control = AccessControl(1000, cache)
+        stored_hash = access_control.set_password("secret")
+        self.assertTrue(access_control.verify_password("secret", stored_hash))
+        self.assertFalse(access_control.verify_password("other", stored_hash))
+        self.assertFalse(access_control.verify_password("other", stored_hash))
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        self.assertFalse(access_control.verify_password("secret", stored_hash, 2000))
+        self.assertEqual(len(cache.keys), 2)
+        cache.ttl = -1
+        access_control.set_password("secret")
+        self.assertTrue(access_control.verify_password("secret", stored_hash))
+        self.assertEqual(cache.misses, 5)
+        with self.assertRaises(ValueError):
+            AccessControl(0)
+
 
 class TestArchiver(unittest.TestCase):
     def setUp(self):
@@ -234,6 +444,427 @@ class TestArchiver(unittest.TestCase):
         self.assertTrue(result)
         self.assertTrue(os.path.exists("test1.txt"))
 
+    def test_compress_streaming(self):
+        result = self.archiver.compress_files([self.file1, self.file2], chunk_size=5)
+        self.assertTrue(result)
+        os.rename("archive.sf", os.path.join(self.test_dir, "archive.sf"))
+        result = self.archiver.decompress_file(os.path.join(self.test_dir, "archive.sf"))
+        self.assertTrue(result)
+        for path in [self.file1, self.file2]:
+            with open(path, 'rb') as original, open(os.path.basename(path), 'rb') as restored:
+                self.assertEqual(restored.read(), original.read())
+
+    def test_compress_parallel(self):
+        result = self.archiver.compress_files([self.test_dir], jobs=2)
+        self.assertTrue(result)
+        os.rename("archive.sf", os.path.join(self.test_dir, "archive.sf"))
+        result = self.archiver.decompress_file(os.path.join(self.test_dir, "archive.sf"))
+        self.assertTrue(result)
+        for path in [self.file1, self.file2]:
+            with open(path, 'rb') as original, open(os.path.basename(path), 'rb') as restored:
+                self.assertEqual(restored.read(), original.read())
+
+    def test_compress_blocks(self):
+        result = self.archiver.compress_files([self.test_dir], jobs=2, block_size=8)
+        self.assertTrue(result)
+        with open("archive.sf", 'rb') as f:
+            self.assertEqual(f.read(4), FileArchiver.SIGNATURE)
+        os.rename("archive.sf", os.path.join(self.test_dir, "archive.sf"))
+        result = self.archiver.decompress_file(os.path.join(self.test_dir, "archive.sf"), jobs=2)
+        self.assertTrue(result)
+        for path in [self.file1, self.file2]:
+            with open(path, 'rb') as original, open(os.path.basename(path), 'rb') as restored:
+                self.assertEqual(restored.read(), original.read())
+
+    def test_compress_word_symbols_archive(self):
+        archiver = FileArchiver(symbol_bits=16)
+        for options in [{}, {'chunk_size': 5}, {'block_size': 7}]:
+            self.assertTrue(archiver.compress_files([self.test_dir], **options))
+            self.assertTrue(self.archiver.decompress_file("archive.sf"))
+            for path in [self.file1, self.file2]:
+                with open(path, 'rb') as original, open(os.path.basename(path), 'rb') as restored:
+                    self.assertEqual(restored.read(), original.read())
+
+    def test_compress_word_symbols_large_table(self):
+        import random
+        data = random.Random(7).randbytes(1 << 16) + bytes(1 << 20)
+        path = os.path.join(self.test_dir, "words.bin")
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.assertTrue(FileArchiver(symbol_bits=16).compress_files([path]))
+        with self.archiver._open_mapped(path + ".sf") as f:
+            entry = self.archiver._open_archive(f, None)[0]
+        self.assertEqual(entry.method, FileArchiver.METHOD_SHANNON_FANO)
+        self.assertGreater(len(entry.codes), 0xFFFF // 5)
+        os.rename(path + ".sf", "words.bin.sf")
+        self.assertTrue(self.archiver.decompress_file("words.bin.sf"))
+        with open("words.bin", 'rb') as restored:
+            self.assertEqual(restored.read(), data)
+        os.remove("words.bin")
+        os.remove("words.bin.sf")
+
+    def test_compress_shared_table(self):
+        archiver = FileArchiver(table_cache=16)
+        self.assertTrue(archiver.compress_files([self.test_dir], shared_table=True))
+        self.assertIsNotNone(archiver.compressor.shared_codes)
+        self.assertTrue(self.archiver.decompress_file("archive.sf"))
+        for path in [self.file1, self.file2]:
+            with open(path, 'rb') as original, open(os.path.basename(path), 'rb') as restored:
+                self.assertEqual(restored.read(), original.read())
+
+    def test_compress_incompressible_stored(self):
+        random_path = os.path.join(self.test_dir, "random.bin")
+        with open(random_path, 'wb') as f:
+            f.write(os.urandom(3000))
+        with open(self.file2, 'w', encoding='utf-8') as f:
+            f.write("abc" * 500)
+        self.archiver.PROBE_SIZE = 1024
+        for options in [{}, {'chunk_size': 500}, {'block_size': 1000}]:
+            self.assertTrue(self.archiver.compress_files([self.test_dir], **options))
+            with self.archiver._open_mapped("archive.sf") as f:
+                entries = {entry.filename: entry for entry in self.archiver._open_archive(f, None)}
+            stored = entries["random.bin"]
+            methods = [block.method for block in stored.blocks] if stored.blocks else [stored.method]
+            self.assertEqual(set(methods), {FileArchiver.METHOD_STORED})
+            self.assertEqual(stored.compressed_size, 3000)
+            self.assertLess(entries["test2.txt"].compressed_size, 1500)
+            self.assertTrue(self.archiver.decompress_file("archive.sf"))
+            with open(random_path, 'rb') as original, open("random.bin", 'rb') as restored:
+                self.assertEqual(restored.read(), original.read())
+        os.remove("random.bin")
+
+    def test_update_archive(self):
+        self.assertTrue(self.archiver.compress_files([self.test_dir]))
+        size_before = os.path.getsize("archive.sf")
+        self.assertTrue(self.archiver.update("archive.sf", [self.test_dir]))
+        self.assertEqual(os.path.getsize("archive.sf"), size_before)
+        with open(self.file2, 'w', encoding='utf-8') as f:
+            f.write("Changed content for file number 2, now longer.")
+        file3 = os.path.join(self.test_dir, "test3.txt")
+        with open(file3, 'w', encoding='utf-8') as f:
+            f.write("A brand new third file")
+        self.assertTrue(self.archiver.update("archive.sf", [self.test_dir], block_size=16))
+        os.remove(file3)
+        self.assertTrue(self.archiver.decompress_file("archive.sf"))
+        try:
+            for path in [self.file1, self.file2]:
+                with open(path, 'rb') as original, open(os.path.basename(path), 'rb') as restored:
+                    self.assertEqual(restored.read(), original.read())
+            with open("test3.txt", 'r', encoding='utf-8') as restored:
+                self.assertEqual(restored.read(), "A brand new third file")
+        finally:
+            os.remove("test3.txt")
+
+    def test_compress_pipeline(self):
+        subdir = os.path.join(self.test_dir, "sub")
+        os.makedirs(subdir)
+        with open(os.path.join(subdir, "test3.txt"), 'w', encoding='utf-8') as f:
+            f.write("Nested file in the pipeline " * 10)
+        self.assertEqual(self.archiver._collect_files([self.test_dir]),
+                         [os.path.join(root, name) for root, _, names in os.walk(self.test_dir) for name in names])
+        for jobs in [1, 2]:
+            self.assertTrue(self.archiver.compress_files([self.test_dir], jobs=jobs, pipeline=True))
+            summary = self.archiver.pipeline_stats.summary()
+            self.assertEqual(set(summary['stage_time']), set(PipelineStats.STAGES))
+            self.assertGreaterEqual(summary['max_depth']['paths'], 1)
+            self.assertTrue(self.archiver.decompress_file("archive.sf"))
+            try:
+                with open(os.path.join(subdir, "test3.txt"), 'rb') as original, open("test3.txt", 'rb') as restored:
+                    self.assertEqual(restored.read(), original.read())
+            finally:
+                os.remove("test3.txt")
+
+    def test_compress_pipeline_read_ahead_bytes(self):
+        for index in range(10):
+            with open(os.path.join(self.test_dir, f"part{index}.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"{index} " * 30)
+        with open(os.path.join(self.test_dir, "big.txt"), 'w', encoding='utf-8') as f:
+            f.write("big " * 200)
+        self.archiver.READ_AHEAD_BYTES = 100
+        self.assertTrue(self.archiver.compress_files([self.test_dir], pipeline=True))
+        self.assertEqual(self.archiver.pipeline_stats.summary()['max_read_ahead'], 800)
+        with open(os.path.join(self.test_dir, "big.txt"), 'w', encoding='utf-8') as f:
+            f.write("big")
+        self.assertTrue(self.archiver.compress_files([self.test_dir], pipeline=True))
+        self.assertLessEqual(self.archiver.pipeline_stats.summary()['max_read_ahead'], 100)
+        self.assertTrue(self.archiver.decompress_file("archive.sf"))
+        for index in range(10):
+            with open(f"part{index}.txt", 'r', encoding='utf-8') as restored:
+                self.assertEqual(restored.read(), f"{index} " * 30)
+            os.remove(f"part{index}.txt")
+        os.remove("big.txt")
+
+    def test_compress_pipeline_forks_before_threads(self):
+        import threading
+        forks = []
+        os.register_at_fork(before=lambda: forks.append(threading.active_count()))
+        before = threading.active_count()
+        self.assertTrue(self.archiver.compress_files([self.test_dir], jobs=2, pipeline=True))
+        self.assertTrue(all(count == before for count in forks[:2]))
+
+    def test_compress_pipeline_error_stops_threads(self):
+        import contextlib
+        import io
+        import threading
+        broken = os.path.join(self.test_dir, "broken")
+        many = os.path.join(self.test_dir, "many")
+        os.makedirs(broken)
+        os.makedirs(many)
+        os.symlink(os.path.join(self.test_dir, "missing"), os.path.join(broken, "link"))
+        for index in range(FileArchiver.QUEUE_SIZE * 4):
+            with open(os.path.join(many, f"file{index}.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"file {index}")
+        before = threading.active_count()
+        for jobs in [1, 2]:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                self.assertFalse(self.archiver.compress_files([broken, many], jobs=jobs, pipeline=True))
+            self.assertEqual(threading.active_count(), before)
+            self.assertFalse(os.path.exists("archive.sf"))
+
+    def test_compress_stream_detects_changed_file(self):
+        import contextlib
+        import io
+        with open(self.file1, 'w', encoding='utf-8') as f:
+            f.write("abcd" * 1000)
+        scan_file = self.archiver._scan_file
+
+        def scan_and_modify(filepath, chunk_size):
+            entry = scan_file(filepath, chunk_size)
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write("dcba" * 1000)
+            return entry
+        self.archiver._scan_file = scan_and_modify
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            self.assertFalse(self.archiver.compress_files([self.file1], chunk_size=500))
+        self.assertIn("изменился во время архивации", output.getvalue())
+        self.assertFalse(os.path.exists(self.file1 + ".sf"))
+
+    def test_compress_pipeline_rejects_blocks(self):
+        import contextlib
+        import io
+        for options in [{'block_size': 4096}, {'chunk_size': 500}]:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                self.assertFalse(self.archiver.compress_files([self.test_dir], pipeline=True, **options))
+            self.assertFalse(os.path.exists("archive.sf"))
+
+    def test_compress_adaptive_rejects_modes(self):
+        import contextlib
+        import io
+        for options in [{'block_size': 4096}, {'chunk_size': 500}, {'pipeline': True}, {'shared_table': True},
+                        {'jobs': 2}]:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+                self.assertFalse(self.archiver.compress_files([self.test_dir], adaptive=True, **options))
+            self.assertIn("адаптивный режим", output.getvalue())
+            self.assertFalse(os.path.exists("archive.sf"))
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            self.assertFalse(FileArchiver(symbol_bits=16).compress_files([self.file1], adaptive=True))
+        self.assertFalse(os.path.exists(self.file1 + ".sf"))
+
+    def test_decompress_parallel_quiet(self):
+        import contextlib
+        import io
+        random_path = os.path.join(self.test_dir, "random.bin")
+        with open(random_path, 'wb') as f:
+            f.write(os.urandom(100))
+        for options in [{}, {'block_size': 8}]:
+            self.assertTrue(self.archiver.compress_files([self.test_dir], **options))
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertTrue(FileArchiver(quiet=True).decompress_file("archive.sf", jobs=2))
+            self.assertNotIn("Распакован", output.getvalue())
+            self.assertNotIn("Было", output.getvalue())
+            for path in [self.file1, self.file2, random_path]:
+                with open(path, 'rb') as original, open(os.path.basename(path), 'rb') as restored:
+                    self.assertEqual(restored.read(), original.read())
+        os.remove("random.bin")
+
+    def test_empty_and_damaged_archive(self):
+        import contextlib
+        import io
+        open("archive.sf", 'wb').close()
+        for method in [self.archiver.list_archive, self.archiver.decompress_file, self.archiver.test_archive]:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertFalse(method("archive.sf"))
+            self.assertIn("неверный формат файла", output.getvalue())
+        with open(self.file1, 'w', encoding='utf-8') as f:
+            f.write("adaptive member " * 500)
+        self.assertTrue(self.archiver.compress_files([self.file1], adaptive=True))
+        with open(self.file1 + ".sf", 'rb') as f:
+            entry = self.archiver._open_archive(f, None)[0]
+        with open(self.file1 + ".sf", 'r+b') as f:
+            f.seek(entry.offset + AdaptiveModel.HEADER.size + 1)
+            f.write(b'\x7f')
+        errors = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(errors):
+            self.assertFalse(self.archiver.extract(self.file1 + ".sf", "test1.txt"))
+        self.assertIn("поврежден сегмент", errors.getvalue())
+        self.assertNotIn("BufferError", errors.getvalue())
+
+    def test_decompress_parallel_bad_member(self):
+        import contextlib
+        import io
+        from concurrent.futures import ProcessPoolExecutor
+        self.assertTrue(self.archiver.compress_files([self.test_dir], block_size=8))
+        with self.archiver._open_mapped("archive.sf") as f:
+            entries = self.archiver._open_archive(f, None)
+        bad, good = entries
+        bad.blocks[0].method = FileArchiver.METHOD_ADAPTIVE
+        bad.blocks[0].compressed_size = 0
+        output = io.StringIO()
+        with ProcessPoolExecutor(max_workers=2) as executor, contextlib.redirect_stdout(output):
+            self.archiver._extract_parallel("archive.sf", entries, executor, 2)
+        self.assertEqual(output.getvalue().count(f"Ошибка при обработке файла {bad.filename}"), 1)
+        with open(os.path.join(self.test_dir, good.filename), 'rb') as original, open(good.filename, 'rb') as restored:
+            self.assertEqual(restored.read(), original.read())
+
+    def test_profiled_stream(self):
+        import contextlib
+        import io
+        stream = io.StringIO()
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            self.assertEqual(profiled(sum, [1, 2, 3], stream=stream), 6)
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertIn("function calls", stream.getvalue())
+
+    def test_stats_collector(self):
+        with open(self.file2, 'w', encoding='utf-8') as f:
+            f.write("abc" * 500)
+        collector = StatsCollector()
+        archiver = FileArchiver(quiet=True, instrumentation=Instrumentation([collector]))
+        for chunk_size in [None, 8]:
+            self.assertTrue(archiver.compress_files([self.file1, self.file2], chunk_size=chunk_size))
+        self.assertTrue(archiver.decompress_file("archive.sf"))
+        summary = collector.summary()
+        self.assertTrue({'read', 'count', 'build', 'encode', 'write', 'directory', 'decode'} <= set(summary['stages']))
+        self.assertEqual(summary['counters']['files'], 6)
+        self.assertEqual(summary['counters']['encode_bytes'], 2 * 1500)
+        self.assertEqual(summary['counters']['decode_bytes'], 1500)
+        self.assertIn('decode', summary['throughput_mb_s'])
+        self.assertFalse(self.archiver.instrumentation.enabled)
+
+    def test_decompress_chunked_output(self):
+        self.archiver.CHUNK_SIZE = 8
+        self.archiver.compress_files([self.file1])
+        self.assertTrue(self.archiver.decompress_file(self.file1 + '.sf'))
+        with open(self.file1, 'rb') as original, open("test1.txt", 'rb') as restored:
+            self.assertEqual(restored.read(), original.read())
+
+    def test_extract_single_member(self):
+        self.archiver.compress_files([self.file1, self.file2])
+        output = os.path.join(self.test_dir, "only2.txt")
+        result = self.archiver.extract("archive.sf", "test2.txt", output_path=output)
+        self.assertTrue(result)
+        self.assertFalse(os.path.exists("test1.txt"))
+        with open(self.file2, 'rb') as original, open(output, 'rb') as restored:
+            self.assertEqual(restored.read(), original.read())
+        self.assertFalse(self.archiver.extract("archive.sf", "missing.txt"))
+
+    def test_open_member_stream(self):
+        with open(self.file2, 'w', encoding='utf-8') as f:
+            f.write("streamed member " * 300)
+        with open(self.file2, 'rb') as f:
+            original = f.read()
+        for options in [{}, {'block_size': 1000}, {'chunk_size': 64}]:
+            self.assertTrue(self.archiver.compress_files([self.file1, self.file2], **options))
+            with self.archiver.open("archive.sf", "test2.txt", chunk_size=100) as member:
+                self.assertEqual(member.read(10), original[:10])
+                self.assertEqual(member.read(), original[10:])
+            with open("archive.sf", 'rb') as f:
+                entry = self.archiver._open_archive(f, None)[1]
+                self.assertEqual(b''.join(self.archiver.iter_decompress(f, entry, 7)), original)
+        with self.assertRaises(KeyError):
+            self.archiver.open("archive.sf", "missing.txt")
+
+    def test_compress_adaptive_stdin(self):
+        import io
+        import sys
+        data = b"line from a pipe\n" * 500
+        stdin = sys.stdin
+        sys.stdin = io.TextIOWrapper(io.BytesIO(data))
+        try:
+            self.assertTrue(self.archiver.compress_files(['-', self.file1]))
+        finally:
+            sys.stdin = stdin
+        with open("archive.sf", 'rb') as f:
+            entries = self.archiver._open_archive(f, None)
+        self.assertEqual([entry.method for entry in entries], [FileArchiver.METHOD_ADAPTIVE] * 2)
+        self.assertTrue(self.archiver.test_archive("archive.sf", jobs=2))
+        with self.archiver.open("archive.sf", FileArchiver.STDIN_NAME, chunk_size=64) as member:
+            self.assertEqual(member.read(), data)
+        self.assertTrue(self.archiver.decompress_file("archive.sf", jobs=2))
+        try:
+            with open(self.file1, 'rb') as original, open("test1.txt", 'rb') as restored:
+                self.assertEqual(restored.read(), original.read())
+        finally:
+            os.remove(FileArchiver.STDIN_NAME)
+
+    def test_list_and_test_archive(self):
+        import contextlib
+        import io
+        with open(self.file2, 'w', encoding='utf-8') as f:
+            f.write("verified member " * 300)
+        self.assertTrue(self.archiver.compress_files([self.file1, self.file2], block_size=1000))
+        self.assertTrue(self.archiver.list_archive("archive.sf"))
+        for jobs in [1, 2]:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertTrue(self.archiver.test_archive("archive.sf", jobs=jobs))
+            self.assertIn("OK: test2.txt", output.getvalue())
+            self.assertNotIn("Было", output.getvalue())
+        self.assertTrue(self.archiver.compress_files([self.file1, self.file2]))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertTrue(self.archiver.test_archive("archive.sf"))
+        self.assertNotIn("Было", output.getvalue())
+        self.assertTrue(self.archiver.compress_files([self.file1, self.file2], block_size=1000))
+        with open("archive.sf", 'r+b') as f:
+            entry = self.archiver._open_archive(f, None)[1]
+            f.seek(entry.offset + 100)
+            byte = f.read(1)[0]
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes((byte ^ 0x5a,)))
+        for jobs in [1, 2]:
+            self.assertFalse(self.archiver.test_archive("archive.sf", jobs=jobs))
+        self.assertFalse(os.path.exists("test2.txt"))
+
+    def test_decompress_legacy_v3(self):
+        import json
+        with open(self.file1, 'rb') as f:
+            data = f.read()
+        compressor = ShannonFanoCompressor()
+        compressed_data, codes, padding = compressor.compress_data(data)
+        archive_path = os.path.join(self.test_dir, "legacy.sf")
+        with open(archive_path, 'wb') as f:
+            f.write(FileArchiver.LEGACY_SIGNATURE)
+            access_data = json.dumps({'password_protected': False, 'password_hash': None,
+                                      'file_count': 1}).encode('utf-8')
+            f.write(len(access_data).to_bytes(4, 'big') + access_data)
+            header_data = json.dumps({'filename': "test1.txt", 'size': len(data),
+                                      'compressed_size': len(compressed_data), 'metadata': {},
+                                      'padding': padding}).encode('utf-8')
+            f.write(len(header_data).to_bytes(4, 'big') + header_data)
+            codes_data = compressor._serialize_codes(codes)
+            f.write(len(codes_data).to_bytes(4, 'big') + codes_data)
+            f.write(compressed_data)
+        self.assertTrue(self.archiver.decompress_file(archive_path))
+        with open("test1.txt", 'rb') as restored:
+            self.assertEqual(restored.read(), data)
+
+    def test_decompress_json_directory_v5(self):
+        self.archiver._write_directory = self.archiver._write_json_directory
+        self.archiver._write_access_header = lambda f, password_hash, file_count: FileArchiver._write_access_header(
+            self.archiver, f, password_hash, file_count, FileArchiver.JSON_SIGNATURE)
+        self.archiver.compress_files([self.file1, self.file2])
+        with open("archive.sf", 'rb') as f:
+            self.assertEqual(f.read(4), FileArchiver.JSON_SIGNATURE)
+        self.assertTrue(FileArchiver().decompress_file("archive.sf"))
+        with open(self.file2, 'rb') as original, open("test2.txt", 'rb') as restored:
+            self.assertEqual(restored.read(), original.read())
+
     def test_decompress_with_password(self):
         self.archiver.compress_files([self.file1], "mypassword")
         archive_path = self.file1 + '.sf'
@@ -241,6 +872,18 @@ class TestArchiver(unittest.TestCase):
         self.assertTrue(result)
         self.assertTrue(os.path.exists("test1.txt"))
 
+    def test_password_kdf_iterations(self):
+        import json
+        FileArchiver(kdf_iterations=1000).compress_files([self.file1], "mypassword")
+        archive_path = self.file1 + '.sf'
+        with open(archive_path, 'rb') as f:
+            f.seek(4)
+            access_header = json.loads(f.read(int.from_bytes(f.read(4), 'big')))
+        self.assertEqual(access_header['kdf_iterations'], 1000)
+        self.assertFalse(self.archiver.decompress_file(archive_path, "wrong"))
+        self.assertFalse(os.path.exists("test1.txt"))
+        self.assertTrue(self.archiver.decompress_file(archive_path, "mypassword"))
+
 
 def run_all_tests():
     print("ЗАПУСК ВСЕХ ТЕСТОВ АРХИВАТОРА SHANNON-FANO")
@@ -250,6 +893,7 @@ def run_all_tests():
     test_suite.addTests(loader.loadTestsFromTestCase(TestNodes))
     test_suite.addTests(loader.loadTestsFromTestCase(TestCompressor))
     test_suite.addTests(loader.loadTestsFromTestCase(TestDecompressor))
+    test_suite.addTests(loader.loadTestsFromTestCase(TestNumpyBackend))
     test_suite.addTests(loader.loadTestsFromTestCase(TestAccessControl))
     test_suite.addTests(loader.loadTestsFromTestCase(TestArchiver))
 